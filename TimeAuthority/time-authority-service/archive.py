@@ -0,0 +1,639 @@
+"""
+Cold Archive - Compressed, randomly accessible storage for old transactions
+Records older than a threshold move out of the hot store into zlib blocks;
+per-segment Bloom filters and seek tables keep a lookup to the blocks that hold it
+"""
+
+from payment_pipeline import PAYMENT_PENDING
+from transaction_store import TransactionStore, record_timestamp_ns, _in_range
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import base64
+import bisect
+import codec
+import hashlib
+import logging
+import os
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Records per compressed block: small enough that a cold lookup inflates
+# only a few tens of KB, large enough for zlib to share the repeated keys
+RECORDS_PER_BLOCK = 128
+HASHES_PER_BLOCK = 512
+COMPRESSION_LEVEL = 9
+
+# Most records moved by one migration step (one segment)
+SEGMENT_RECORDS = 65536
+
+# Bloom filter size and probes per key: about a 1% false-positive rate,
+# so a lookup inflates blocks of roughly one segment in a hundred that
+# do not hold its key
+BLOOM_BITS_PER_KEY = 10
+BLOOM_PROBES = 7
+
+
+class BloomFilter:
+    """Set membership with false positives, stored as base64 in the seek table"""
+
+    def __init__(self, bits: bytearray, probes: int = BLOOM_PROBES):
+        self.bits = bits
+        self.probes = probes
+        self.size = len(bits) * 8
+
+    @classmethod
+    def build(cls, keys: Iterable[str], count: int) -> "BloomFilter":
+        bloom = cls(bytearray(max(1, count * BLOOM_BITS_PER_KEY // 8)))
+        for key in keys:
+            for i in bloom._probe(key):
+                bloom.bits[i >> 3] |= 1 << (i & 7)
+        return bloom
+
+    def _probe(self, key: str) -> Iterator[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.probes):
+            yield (h1 + i * h2) % self.size
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[i >> 3] & (1 << (i & 7)) for i in self._probe(key))
+
+    def to_json(self) -> Dict:
+        return {"probes": self.probes, "bits": base64.b64encode(bytes(self.bits)).decode()}
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "BloomFilter":
+        return cls(bytearray(base64.b64decode(data["bits"])), data["probes"])
+
+
+class ColdArchive:
+    """
+    Append-only file of compressed blocks plus a seek table per segment
+
+    Each migration step writes one segment. Its records are sorted by
+    transaction ID and cut into blocks, so every block covers a narrow,
+    non-overlapping ID range; a second set of blocks holds the segment's
+    (document_hash, transaction_id) pairs sorted by hash. The seek tables
+    (offset, length, first and last key of every block) and a Bloom filter
+    of the segment's IDs and one of its hashes are kept in path + ".index",
+    one JSON line per segment, and loaded into memory.
+
+    Transaction IDs are not ordered by time, so every segment's ID range
+    spans most of the ID space; the filters are what let a lookup skip
+    the segments that do not hold a key without inflating anything.
+
+    Read methods take an optional segments list (see the segments
+    property) so a caller can read from one fixed view of the archive.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = path + ".index"
+        self._lock = threading.Lock()
+        self._segments: List[Dict] = []
+        self.cold_lookups = 0
+        self.cold_lookup_ns = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as f:
+                for line in f:
+                    # A line without its newline is a segment whose write
+                    # was interrupted; its blocks are simply unreferenced
+                    if line.endswith("\n") and line.strip():
+                        self._segments.append(self._prepare(codec.loads(line)))
+
+    @staticmethod
+    def _prepare(segment: Dict) -> Dict:
+        # Last key of each block, for bisecting the seek tables
+        segment["_last_ids"] = [block["last_id"] for block in segment["blocks"]]
+        segment["_last_hashes"] = [block["last_hash"] for block in segment["hash_blocks"]]
+        # Segments written before the filters existed may hold any key
+        segment["_ids"] = BloomFilter.from_json(segment["id_filter"]) if "id_filter" in segment else None
+        segment["_hashes"] = BloomFilter.from_json(segment["hash_filter"]) if "hash_filter" in segment else None
+        return segment
+
+    @staticmethod
+    def _may_hold(bloom: Optional[BloomFilter], keys: Iterable[str]) -> List[str]:
+        return [key for key in keys if bloom is None or key in bloom]
+
+    @property
+    def segments(self) -> List[Dict]:
+        """The current segments; the list is replaced, never modified"""
+        return self._segments
+
+    @staticmethod
+    def end_position(segments: List[Dict]) -> int:
+        """Store position of the newest record in segments (0 when empty)"""
+        return segments[-1]["end_position"] if segments else 0
+
+    def write_segment(self, entries: List[Tuple[int, Dict]]) -> Dict:
+        """
+        Compress (position, record) pairs, in store order, into a new segment
+
+        The segment becomes visible to readers only after its blocks and
+        seek table are on disk.
+        """
+        by_id = sorted(entries, key=lambda entry: entry[1]["transaction_id"])
+        raw_bytes = 0
+        payloads = []
+        blocks = []
+        for i in range(0, len(by_id), RECORDS_PER_BLOCK):
+            chunk = by_id[i:i + RECORDS_PER_BLOCK]
+            lines = []
+            for position, transaction in chunk:
+                record = codec.dumps_bytes(transaction)
+                raw_bytes += len(record) + 1
+                # Positions ride along so tail() can restore store order
+                lines.append(b'{"position":%d,"record":%s}' % (position, record))
+            payloads.append(zlib.compress(b"\n".join(lines), COMPRESSION_LEVEL))
+            blocks.append({"first_id": chunk[0][1]["transaction_id"], "last_id": chunk[-1][1]["transaction_id"]})
+
+        by_hash = sorted((tx.get("document_hash") or "", tx["transaction_id"]) for _, tx in entries)
+        hash_blocks = []
+        for i in range(0, len(by_hash), HASHES_PER_BLOCK):
+            chunk = by_hash[i:i + HASHES_PER_BLOCK]
+            payloads.append(zlib.compress(codec.dumps_bytes(chunk), COMPRESSION_LEVEL))
+            hash_blocks.append({"first_hash": chunk[0][0], "last_hash": chunk[-1][0]})
+
+        with self._lock:
+            with open(self.path, 'ab') as f:
+                offset = f.seek(0, os.SEEK_END)
+                for block, payload in zip(blocks + hash_blocks, payloads):
+                    block["offset"] = offset
+                    block["length"] = len(payload)
+                    offset += len(payload)
+                f.write(b"".join(payloads))
+                f.flush()
+                os.fsync(f.fileno())
+
+            segment = {
+                "start_position": entries[0][0],
+                "end_position": entries[-1][0],
+                "count": len(entries),
+                "total_revenue": sum(tx.get("payment_amount", 0) for _, tx in entries),
+                "first_ns": record_timestamp_ns(entries[0][1]),
+                "last_ns": record_timestamp_ns(entries[-1][1]),
+                "raw_bytes": raw_bytes,
+                "compressed_bytes": sum(len(payload) for payload in payloads),
+                "blocks": blocks,
+                "hash_blocks": hash_blocks,
+                "id_filter": BloomFilter.build((tx["transaction_id"] for _, tx in entries), len(entries)).to_json(),
+                "hash_filter": BloomFilter.build((h for h, _ in by_hash), len(by_hash)).to_json()
+            }
+            with open(self.index_path, 'a') as f:
+                f.write(codec.dumps(segment) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._segments = self._segments + [self._prepare(segment)]
+        return segment
+
+    def _read_block(self, block: Dict) -> bytes:
+        with open(self.path, 'rb') as f:
+            f.seek(block["offset"])
+            return zlib.decompress(f.read(block["length"]))
+
+    def _read_records(self, block: Dict) -> List[Tuple[int, Dict]]:
+        entries = []
+        for line in self._read_block(block).split(b"\n"):
+            entry = codec.loads(line)
+            entries.append((entry["position"], entry["record"]))
+        return entries
+
+    @staticmethod
+    def _blocks_between(blocks: List[Dict], last_keys: List[str], first_field: str, low: str, high: str) -> Iterator[Dict]:
+        # Blocks, in key order, whose [first, last] key range meets [low, high]
+        for i in range(bisect.bisect_left(last_keys, low), len(blocks)):
+            if blocks[i][first_field] > high:
+                return
+            yield blocks[i]
+
+    def lookup_ids(self, transaction_ids: Iterable[str], segments: Optional[List[Dict]] = None) -> Iterator[Tuple[str, Dict]]:
+        """Yield (transaction_id, record) for archived IDs, inflating each block at most once"""
+        remaining = set(transaction_ids)
+        found = set()
+        for segment in self._segments if segments is None else segments:
+            remaining -= found
+            if not remaining:
+                return
+            wanted = sorted(self._may_hold(segment["_ids"], remaining))
+            if not wanted:
+                continue
+            for block in self._blocks_between(segment["blocks"], segment["_last_ids"], "first_id", wanted[0], wanted[-1]):
+                lo = bisect.bisect_left(wanted, block["first_id"])
+                hi = bisect.bisect_right(wanted, block["last_id"])
+                keys = set(wanted[lo:hi]) - found
+                if not keys:
+                    continue
+                for _, transaction in self._read_records(block):
+                    transaction_id = transaction["transaction_id"]
+                    if transaction_id in keys:
+                        keys.discard(transaction_id)
+                        found.add(transaction_id)
+                        yield transaction_id, transaction
+
+    def lookup_hashes(self, document_hashes: Iterable[str], segments: Optional[List[Dict]] = None) -> Iterator[Tuple[str, Dict]]:
+        """Yield (document_hash, record) for every archived record witnessing one of the hashes"""
+        wanted_set = set(document_hashes)
+        if not wanted_set:
+            return
+        for segment in self._segments if segments is None else segments:
+            wanted = sorted(self._may_hold(segment["_hashes"], wanted_set))
+            if not wanted:
+                continue
+            ids = set()
+            for block in self._blocks_between(
+                segment["hash_blocks"], segment["_last_hashes"], "first_hash", wanted[0], wanted[-1]
+            ):
+                ids.update(tid for document_hash, tid in codec.loads(self._read_block(block)) if document_hash in wanted_set)
+            if not ids:
+                continue
+            ordered = sorted(ids)
+            for block in self._blocks_between(segment["blocks"], segment["_last_ids"], "first_id", ordered[0], ordered[-1]):
+                if not any(block["first_id"] <= tid <= block["last_id"] for tid in ids):
+                    continue
+                for _, transaction in self._read_records(block):
+                    document_hash = transaction.get("document_hash")
+                    if transaction["transaction_id"] in ids and document_hash in wanted_set:
+                        yield document_hash, transaction
+
+    def _timed(self, lookup: Callable):
+        start_ns = time.perf_counter_ns()
+        try:
+            return lookup()
+        finally:
+            self.cold_lookups += 1
+            self.cold_lookup_ns += time.perf_counter_ns() - start_ns
+
+    def get_by_id(self, transaction_id: str) -> Optional[Dict]:
+        return self._timed(lambda: next((tx for _, tx in self.lookup_ids([transaction_id])), None))
+
+    def get_by_hash(self, document_hash: str) -> List[Dict]:
+        transactions = self._timed(lambda: [tx for _, tx in self.lookup_hashes([document_hash])])
+        transactions.sort(key=record_timestamp_ns)
+        return transactions
+
+    def tail(self, position: int = 0, segments: Optional[List[Dict]] = None) -> Iterator[Tuple[int, Dict]]:
+        """Iterate archived (position, record) pairs after position, in store order"""
+        for segment in self._segments if segments is None else segments:
+            if segment["end_position"] <= position:
+                continue
+            entries = []
+            for block in segment["blocks"]:
+                entries.extend(entry for entry in self._read_records(block) if entry[0] > position)
+            entries.sort(key=lambda entry: entry[0])
+            yield from entries
+
+    def scan(
+        self,
+        start_unix: Optional[int] = None,
+        end_unix: Optional[int] = None,
+        start_id: Optional[str] = None,
+        end_id: Optional[str] = None,
+        start_ns: Optional[int] = None,
+        end_ns: Optional[int] = None,
+        segments: Optional[List[Dict]] = None
+    ) -> Iterator[Dict]:
+        """Filter like TransactionStore.scan, skipping segments and blocks outside the ranges"""
+        low_ns = max(start_ns or 0, (start_unix or 0) * 1_000_000_000)
+        high_ns = min(
+            end_ns if end_ns is not None else float("inf"),
+            end_unix * 1_000_000_000 if end_unix is not None else float("inf")
+        )
+        for segment in self._segments if segments is None else segments:
+            if segment["last_ns"] < low_ns or segment["first_ns"] >= high_ns:
+                continue
+            entries = []
+            for block in segment["blocks"]:
+                if start_id is not None and block["last_id"] < start_id:
+                    continue
+                if end_id is not None and block["first_id"] >= end_id:
+                    continue
+                entries.extend(
+                    entry for entry in self._read_records(block)
+                    if _in_range(entry[1], start_unix, end_unix, start_id, end_id, start_ns, end_ns)
+                )
+            entries.sort(key=lambda entry: entry[0])
+            for _, transaction in entries:
+                yield transaction
+
+    def aggregate(self, segments: Optional[List[Dict]] = None) -> Dict:
+        segments = self._segments if segments is None else segments
+        return {
+            "count": sum(segment["count"] for segment in segments),
+            "total_revenue": sum(segment["total_revenue"] for segment in segments)
+        }
+
+    def stats(self) -> Dict:
+        """Size, compression ratio and point-lookup latency of the archive"""
+        segments = self._segments
+        raw_bytes = sum(segment["raw_bytes"] for segment in segments)
+        compressed_bytes = sum(segment["compressed_bytes"] for segment in segments)
+        lookups = self.cold_lookups
+        return {
+            "segments": len(segments),
+            "records": sum(segment["count"] for segment in segments),
+            "newest_archived_ns": segments[-1]["last_ns"] if segments else None,
+            "raw_bytes": raw_bytes,
+            "compressed_bytes": compressed_bytes,
+            "compression_ratio": round(raw_bytes / compressed_bytes, 2) if compressed_bytes else None,
+            "cold_lookups": lookups,
+            "cold_lookup_avg_ms": round(self.cold_lookup_ns / lookups / 1e6, 3) if lookups else None
+        }
+
+
+class TieredTransactionStore(TransactionStore):
+    """
+    A hot TransactionStore in front of a ColdArchive
+
+    Reads cover both tiers and positions are the hot store's, so callers
+    (hash chain, exports, replication, audits) see a single log. New
+    records and updates always go to the hot store; archived records are
+    final, which is why migrate() never archives a record whose payment
+    is still pending. migrate() moves the oldest records into the archive.
+    """
+
+    def __init__(self, hot: TransactionStore, archive: ColdArchive):
+        self.hot = hot
+        self.archive = archive
+        self._migrate_lock = threading.Lock()
+        # The pending record the last migration stopped at, if any
+        self.held_by = None
+        # Finish a migration interrupted after its segment was written
+        self._drop_archived()
+
+    def _drop_archived(self):
+        # Drop hot records the archive already holds, if any remain
+        end_position = self.archive.end_position(self.archive.segments)
+        first = next(self.hot.tail(0), None)
+        if end_position and first and first[0] <= end_position:
+            self.hot.drop_before(end_position)
+
+    def _with_hot(self, read_hot: Callable[[int], object]) -> Tuple[List[Dict], object]:
+        """
+        Pair an archive view with a hot read that starts after it
+
+        migrate() publishes a segment before dropping its records from the
+        hot store, so any record missing from the hot read is in a segment
+        published before it started; if that happened after the view was
+        taken, read again.
+        """
+        while True:
+            segments = self.archive.segments
+            result = read_hot(self.archive.end_position(segments))
+            if self.archive.segments is segments:
+                return segments, result
+
+    @staticmethod
+    def _started(records: Iterator) -> Tuple[Optional[object], Iterator]:
+        # Pull the first item so the hot store opens its file or snapshot now
+        return next(records, None), records
+
+    def append_many(self, transactions: Iterable[Dict]):
+        self.hot.append_many(transactions)
+
+    def update(self, transaction_id: str, fields: Dict, prev_hash: Optional[str] = None) -> Optional[Dict]:
+        return self.hot.update(transaction_id, fields, prev_hash)
+
+    def get_by_id(self, transaction_id: str) -> Optional[Dict]:
+        # Hot first: recent IDs are looked up most, and records leave the
+        # hot store only after the archive can serve them
+        transaction = self.hot.get_by_id(transaction_id)
+        if transaction is None:
+            transaction = self.archive.get_by_id(transaction_id)
+        return transaction
+
+    def get_by_hash(self, document_hash: str) -> List[Dict]:
+        cold = self.archive.get_by_hash(document_hash)
+        archived = {(tx["transaction_id"], record_timestamp_ns(tx)) for tx in cold}
+        # Skip records still in the hot store while their migration finishes
+        return cold + [
+            tx for tx in self.hot.get_by_hash(document_hash)
+            if (tx["transaction_id"], record_timestamp_ns(tx)) not in archived
+        ]
+
+    def lookup_ids(self, transaction_ids: Iterable[str]) -> Iterator[Tuple[str, Dict]]:
+        remaining = set(transaction_ids)
+        for transaction_id, transaction in self.hot.lookup_ids(remaining):
+            remaining.discard(transaction_id)
+            yield transaction_id, transaction
+        if remaining:
+            yield from self.archive.lookup_ids(remaining)
+
+    def lookup_hashes(self, document_hashes: Iterable[str]) -> Iterator[Tuple[str, Dict]]:
+        document_hashes = set(document_hashes)
+        archived = set()
+        for document_hash, transaction in self.archive.lookup_hashes(document_hashes):
+            archived.add((transaction["transaction_id"], record_timestamp_ns(transaction)))
+            yield document_hash, transaction
+        for document_hash, transaction in self.hot.lookup_hashes(document_hashes):
+            if (transaction["transaction_id"], record_timestamp_ns(transaction)) not in archived:
+                yield document_hash, transaction
+
+    def lookup(
+        self,
+        transaction_ids: Iterable[str],
+        document_hashes: Iterable[str]
+    ) -> Iterator[Tuple[str, str, Dict]]:
+        remaining = set(transaction_ids)
+        document_hashes = set(document_hashes)
+        archived = set()
+        for document_hash, transaction in self.archive.lookup_hashes(document_hashes):
+            archived.add((transaction["transaction_id"], record_timestamp_ns(transaction)))
+            yield "document_hash", document_hash, transaction
+        for kind, key, transaction in self.hot.lookup(set(remaining), document_hashes):
+            if kind == "transaction_id":
+                remaining.discard(key)
+                yield kind, key, transaction
+            elif (transaction["transaction_id"], record_timestamp_ns(transaction)) not in archived:
+                yield kind, key, transaction
+        for transaction_id, transaction in self.archive.lookup_ids(remaining):
+            yield "transaction_id", transaction_id, transaction
+
+    def scan(
+        self,
+        start_unix: Optional[int] = None,
+        end_unix: Optional[int] = None,
+        start_id: Optional[str] = None,
+        end_id: Optional[str] = None,
+        start_ns: Optional[int] = None,
+        end_ns: Optional[int] = None,
+        after_position: int = 0
+    ) -> Iterator[Dict]:
+        filters = (start_unix, end_unix, start_id, end_id, start_ns, end_ns)
+        segments, (first, records) = self._with_hot(
+            lambda end: self._started(self.hot.scan(*filters, after_position=max(end, after_position)))
+        )
+        if after_position:
+            for _, transaction in self.archive.tail(after_position, segments):
+                if _in_range(transaction, *filters):
+                    yield transaction
+        else:
+            yield from self.archive.scan(*filters, segments=segments)
+        if first is not None:
+            yield first
+            yield from records
+
+    def tail(self, position: int = 0) -> Iterator[Tuple[int, Dict]]:
+        segments, (first, records) = self._with_hot(
+            lambda end: self._started(self.hot.tail(max(end, position)))
+        )
+        yield from self.archive.tail(position, segments)
+        if first is not None:
+            yield first
+            yield from records
+
+    def tail_updates(self, position: int = 0) -> Iterator[Tuple[int, Dict]]:
+        return self.hot.tail_updates(position)
+
+    def drop_before(self, position: int):
+        raise RuntimeError("TieredTransactionStore keeps archived records; use migrate() to move records out of the hot store")
+
+    def last(self) -> Optional[Dict]:
+        # migrate() always leaves the newest record in the hot store
+        return self.hot.last()
+
+    def max_timestamp_ns(self) -> int:
+        return self.hot.max_timestamp_ns()
+
+    def aggregate(self, after_position: int = 0) -> Dict:
+        segments, hot = self._with_hot(lambda end: self.hot.aggregate(max(end, after_position)))
+        if after_position:
+            cold = {"count": 0, "total_revenue": 0}
+            for _, transaction in self.archive.tail(after_position, segments):
+                cold["count"] += 1
+                cold["total_revenue"] += transaction.get("payment_amount", 0)
+        else:
+            cold = self.archive.aggregate(segments)
+        return {
+            "count": cold["count"] + hot["count"],
+            "total_revenue": cold["total_revenue"] + hot["total_revenue"]
+        }
+
+    def _next_segment(self, before_ns: int, max_records: int) -> List[Tuple[int, Dict]]:
+        # The oldest unarchived records stamped before before_ns, stopping
+        # short of the newest record and of the first pending payment,
+        # whose outcome is still to be written by update()
+        entries = []
+        previous = None
+        self.held_by = None
+        for position, transaction in self.hot.tail(self.archive.end_position(self.archive.segments)):
+            if previous is not None:
+                entries.append(previous)
+                if len(entries) >= max_records:
+                    break
+            if record_timestamp_ns(transaction) >= before_ns:
+                break
+            if transaction.get("payment_status") == PAYMENT_PENDING:
+                self.held_by = {
+                    "transaction_id": transaction["transaction_id"],
+                    "timestamp_unix": transaction.get("timestamp_unix")
+                }
+                break
+            previous = (position, transaction)
+        return entries
+
+    def migrate(
+        self,
+        before_ns: int,
+        max_records: Optional[int] = None,
+        segment_records: int = SEGMENT_RECORDS,
+        stop: Optional[threading.Event] = None
+    ) -> int:
+        """
+        Archive the oldest records stamped before before_ns (at most max_records)
+
+        Records go into segments of up to segment_records each; once all
+        are written they are dropped from the hot store in a single pass,
+        since every drop rewrites (JSONL) or rescans the hot store. Setting
+        stop ends the run after the current segment. Returns how many
+        records were moved. The newest record always stays hot, so last()
+        and the hash chain head never need the archive, and archiving stops
+        at the first record with a pending payment.
+        """
+        with self._migrate_lock:
+            moved = 0
+            try:
+                while max_records is None or moved < max_records:
+                    if stop is not None and stop.is_set():
+                        break
+                    limit = segment_records if max_records is None else min(segment_records, max_records - moved)
+                    entries = self._next_segment(before_ns, limit)
+                    if not entries:
+                        break
+                    self.archive.write_segment(entries)
+                    moved += len(entries)
+            finally:
+                # Also after a failed segment, so the ones written before
+                # it leave the hot store (or were left by an earlier failure)
+                self._drop_archived()
+            return moved
+
+    def close(self):
+        self.hot.close()
+
+
+class ArchiveMigrator:
+    """
+    Background thread moving records older than max_age_seconds to the archive
+
+    Runs every interval seconds. Compression happens outside every store
+    lock, so stamping carries on while a migration is in progress. A failed
+    run is logged, kept in last_error and retried with backoff.
+    """
+
+    def __init__(
+        self,
+        store: TieredTransactionStore,
+        max_age_seconds: float,
+        interval: float = 3600,
+        retry_delay: float = 60.0
+    ):
+        self.store = store
+        self.max_age_seconds = max_age_seconds
+        self.interval = interval
+        self.retry_delay = retry_delay
+        self.last_run = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="archive-migrator", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def run_once(self) -> Dict:
+        """Archive everything currently older than the threshold"""
+        start = time.perf_counter()
+        before_ns = time.time_ns() - int(self.max_age_seconds * 1_000_000_000)
+        moved = self.store.migrate(before_ns, stop=self._stop)
+        self.last_run = {
+            "records_archived": moved,
+            "seconds": round(time.perf_counter() - start, 3),
+            "finished_unix": int(time.time()),
+            # Archiving stops at the oldest record whose payment is pending
+            "held_by_pending": self.store.held_by
+        }
+        self.last_error = None
+        return self.last_run
+
+    def _run(self):
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+                failures = 0
+                delay = self.interval
+            except Exception as e:
+                self.last_error = {"error": f"{e.__class__.__name__}: {e}", "failed_unix": int(time.time())}
+                failures += 1
+                delay = min(self.retry_delay * 2 ** (failures - 1), self.interval)
+                logger.error("Archive migration failed (%s); retrying in %.0fs", self.last_error["error"], delay)
+            self._stop.wait(delay)
@@ -0,0 +1,75 @@
+"""
+Codec - JSON encoding/decoding and request validation for the hot paths
+Uses orjson when installed and falls back to the standard library
+"""
+
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+from typing import Any, Type, TypeVar, Union
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Name of the JSON implementation in use ("orjson" or "json")
+JSON_BACKEND = "orjson" if orjson else "json"
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# Reused stdlib encoder/decoder, built once rather than per call
+_std_encoder = json.JSONEncoder()
+_std_decoder = json.JSONDecoder()
+
+
+def _std_dumps_bytes(obj: Any) -> bytes:
+    return _std_encoder.encode(obj).encode()
+
+
+def _std_loads(data: Union[str, bytes]) -> Any:
+    if isinstance(data, bytes):
+        data = data.decode()
+    return _std_decoder.decode(data)
+
+
+if orjson:
+    def dumps_bytes(obj: Any) -> bytes:
+        """Encode obj as compact UTF-8 JSON"""
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # orjson rejects integers wider than 64 bits; keep them exact
+            return _std_dumps_bytes(obj)
+
+    def loads(data: Union[str, bytes]) -> Any:
+        """
+        Decode a JSON document from str or bytes
+
+        Note orjson reads integers wider than 64 bits as floats.
+        """
+        return orjson.loads(data)
+else:
+    dumps_bytes = _std_dumps_bytes
+    loads = _std_loads
+
+
+def dumps(obj: Any) -> str:
+    """Encode obj as JSON text (for log lines and headers)"""
+    return dumps_bytes(obj).decode()
+
+
+def validate_json(model: Type[ModelT], data: Union[str, bytes]) -> ModelT:
+    """
+    Parse and validate a request body in one step with pydantic's compiled schema
+
+    Raises RequestValidationError, so clients get the same 422 response as
+    when FastAPI validates the body itself.
+    """
+    try:
+        return model.model_validate_json(data)
+    except ValidationError as e:
+        errors = e.errors(include_url=False)
+        for error in errors:
+            error["loc"] = ("body",) + tuple(error["loc"])
+        raise RequestValidationError(errors)
@@ -0,0 +1,134 @@
+"""
+Codec Benchmark - Per-request CPU cost of the /timestamp encode/decode steps
+Compares the previous stdlib/FastAPI code paths with the codec module
+"""
+
+import argparse
+import json
+import timeit
+from typing import Callable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+import codec
+
+
+class DocumentRequest(BaseModel):
+    content: Optional[str] = None
+    hash: Optional[str] = None
+    metadata: Optional[dict] = None
+
+
+class TimestampResponse(BaseModel):
+    transaction_id: str
+    timestamp: str
+    timestamp_unix: int
+    timestamp_ns: int
+    document_hash: str
+    witnessed_by: str
+    payment_verified: bool
+    payment_status: str
+    signature: str
+
+
+BODY = json.dumps({
+    "content": "Important document to timestamp " * 8,
+    "metadata": {"document_type": "contract", "parties": ["Alice", "Bob"]}
+}).encode()
+
+PAYMENT_HEADER = json.dumps({
+    "transaction_hash": "0xabcdef1234567890abcdef1234567890abcdef1234567890abcdef1234567890",
+    "amount": "0.01",
+    "currency": "USDC",
+    "network": "base",
+    "from": "0x1111111111111111111111111111111111111111",
+    "to": "0x9A51D52CcbeB0C414d1C4A0feC6fe345A169C1a4",
+    "timestamp": "2026-02-13T07:14:40.360880"
+})
+
+RECORD = {
+    "transaction_id": "40688236",
+    "timestamp": "2026-02-13T07:14:40.360880+00:00",
+    "timestamp_unix": 1770966880,
+    "timestamp_ns": 1770966880360880123,
+    "document_hash": "ef4277a4cbd5b6314229a653c1783a00c1d6eb2c65eaf72ed326f5fc3e46f5e3",
+    "payment_amount": 0.01,
+    "payment_token": "USDC",
+    "payment_network": "base",
+    "payment_verified": True,
+    "payment_status": "confirmed",
+    "metadata": {"document_type": "contract", "parties": ["Alice", "Bob"]},
+    "prev_hash": "cad92c220646afbf9499a7ee8066b316e51229f83d43bf8a26ae062a82e08c77"
+}
+
+RESPONSE = {
+    "transaction_id": "40688236",
+    "timestamp": "2026-02-13T07:14:40.360880+00:00",
+    "timestamp_unix": 1770966880,
+    "timestamp_ns": 1770966880360880123,
+    "document_hash": "ef4277a4cbd5b6314229a653c1783a00c1d6eb2c65eaf72ed326f5fc3e46f5e3",
+    "witnessed_by": "Time Authority",
+    "payment_verified": True,
+    "payment_status": "confirmed",
+    "signature": "Time Authority #40688236"
+}
+
+PAYMENT_RESPONSE = {"status": "confirmed", "transaction_id": "40688236", "amount": 0.01, "currency": "USDC"}
+
+LOG_LINE = json.dumps(RECORD).encode() + b"\n"
+
+
+def _baseline_response():
+    # What FastAPI did for a returned pydantic model: build, dump, encode
+    model = TimestampResponse(**RESPONSE)
+    return json.dumps(model.model_dump()).encode()
+
+
+# (step, previous implementation, codec implementation); steps marked
+# per_request run once per /timestamp call
+CASES: List[Tuple[str, bool, Callable, Callable]] = [
+    ("parse DocumentRequest body", True,
+     lambda: DocumentRequest.model_validate(json.loads(BODY)),
+     lambda: codec.validate_json(DocumentRequest, BODY)),
+    ("decode X-Payment header", True,
+     lambda: json.loads(PAYMENT_HEADER),
+     lambda: codec.loads(PAYMENT_HEADER)),
+    ("encode log record", True,
+     lambda: json.dumps(RECORD) + "\n",
+     lambda: codec.dumps_bytes(RECORD) + b"\n"),
+    ("encode X-Payment-Response", True,
+     lambda: json.dumps(PAYMENT_RESPONSE),
+     lambda: codec.dumps(PAYMENT_RESPONSE)),
+    ("encode TimestampResponse", True,
+     _baseline_response,
+     lambda: codec.dumps_bytes(RESPONSE)),
+    ("decode log line (read paths)", False,
+     lambda: json.loads(LOG_LINE),
+     lambda: codec.loads(LOG_LINE)),
+]
+
+
+def _per_call_us(fn: Callable, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def run(number: int):
+    print(f"JSON backend: {codec.JSON_BACKEND}")
+    print(f"  {'step':<30} {'before':>10} {'codec':>10} {'saved':>10}")
+    before_total = after_total = 0.0
+    for step, per_request, before, after in CASES:
+        before_us = _per_call_us(before, number)
+        after_us = _per_call_us(after, number)
+        print(f"  {step:<30} {before_us:8.2f}us {after_us:8.2f}us {before_us - after_us:8.2f}us")
+        if per_request:
+            before_total += before_us
+            after_total += after_us
+    print(f"  {'per /timestamp request':<30} {before_total:8.2f}us {after_total:8.2f}us "
+          f"{before_total - after_total:8.2f}us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmark the codec layer")
+    parser.add_argument("--number", type=int, default=20000, help="Calls per timing run")
+    args = parser.parse_args()
+    run(args.number)
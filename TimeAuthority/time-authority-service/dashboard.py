@@ -5,15 +5,15 @@ Simple web interface to monitor your Time Authority service
 
 from fastapi.responses import HTMLResponse
 from fastapi import FastAPI
-import json
-import os
-from datetime import datetime
+from transaction_store import TransactionStore, record_timestamp_ns
+from tracing import span
 
-def add_dashboard_routes(app: FastAPI):
+def add_dashboard_routes(app: FastAPI, store: TransactionStore):
     """Add dashboard routes to the main FastAPI app"""
     
+    # Plain def: the scan runs in the threadpool, not on the event loop
     @app.get("/dashboard", response_class=HTMLResponse)
-    async def dashboard():
+    def dashboard():
         """
         Web dashboard to view transactions and revenue
         """
@@ -22,18 +22,17 @@ def add_dashboard_routes(app: FastAPI):
         transactions = []
         total_revenue = 0
         
-        if os.path.exists("transaction_log.jsonl"):
-            with open("transaction_log.jsonl", 'r') as f:
-                for line in f:
-                    tx = json.loads(line)
-                    transactions.append(tx)
-                    total_revenue += tx.get("payment_amount", 0)
+        with span("store_scan"):
+            for tx in store.scan():
+                transactions.append(tx)
+                total_revenue += tx.get("payment_amount", 0)
         
         # Sort by timestamp descending
-        transactions.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
+        transactions.sort(key=record_timestamp_ns, reverse=True)
         
         # Generate HTML
-        html = f"""
+        with span("render", records=len(transactions)):
+            html = f"""
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -290,7 +289,7 @@ def add_dashboard_routes(app: FastAPI):
                         <div class="detail-item">
                             <div class="detail-label">Verification</div>
                             <div class="detail-value">
-                                {"<span class='verified-badge'>✓ VERIFIED</span>" if tx.get("payment_verified") else "Pending"}
+                                {"<span class='verified-badge'>✓ VERIFIED</span>" if tx.get("payment_verified") else tx.get("payment_status", "pending").capitalize()}
                             </div>
                         </div>
                     </div>
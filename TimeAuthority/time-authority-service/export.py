@@ -0,0 +1,142 @@
+"""
+Bulk Export - Stream complete transaction records for auditors
+Exports a time or ID range as NDJSON or CSV, optionally gzip-compressed
+"""
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from transaction_store import TransactionStore
+from typing import Dict, Iterator, Optional
+import codec
+import csv
+import io
+import zlib
+
+# Flush encoded rows to the client once this many bytes are buffered.
+# Memory per export stays near this size regardless of range length.
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+CSV_FIELDS = [
+    "transaction_id",
+    "timestamp",
+    "timestamp_unix",
+    "timestamp_ns",
+    "document_hash",
+    "payment_amount",
+    "payment_token",
+    "payment_network",
+    "payment_verified",
+    "payment_status",
+    "metadata",
+]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _ndjson_chunks(transactions: Iterator[Dict]) -> Iterator[bytes]:
+    """Encode records as NDJSON, yielding roughly EXPORT_CHUNK_BYTES at a time"""
+    buffer = []
+    size = 0
+    for transaction in transactions:
+        line = codec.dumps_bytes(transaction) + b"\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def _csv_chunks(transactions: Iterator[Dict]) -> Iterator[bytes]:
+    """Encode records as CSV with a header row, yielding in bounded chunks"""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(CSV_FIELDS)
+    for transaction in transactions:
+        row = [transaction.get(field, "") for field in CSV_FIELDS]
+        row[-1] = codec.dumps(transaction.get("metadata") or {})
+        writer.writerow(row)
+        if out.tell() >= EXPORT_CHUNK_BYTES:
+            yield out.getvalue().encode()
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue().encode()
+
+
+def _gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Compress a chunk stream into a single gzip member"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(
+    store: TransactionStore,
+    format: str = "ndjson",
+    compress: bool = False,
+    start_unix: Optional[int] = None,
+    end_unix: Optional[int] = None,
+    start_id: Optional[str] = None,
+    end_id: Optional[str] = None,
+    start_ns: Optional[int] = None,
+    end_ns: Optional[int] = None
+) -> Iterator[bytes]:
+    """
+    Build a lazy byte stream of records in the requested range
+
+    Nothing is read from the store until the stream is iterated, and each
+    chunk is only produced when the consumer asks for the next one.
+    """
+    transactions = store.scan(start_unix, end_unix, start_id, end_id, start_ns, end_ns)
+    if format == "csv":
+        chunks = _csv_chunks(transactions)
+    else:
+        chunks = _ndjson_chunks(transactions)
+    if compress:
+        chunks = _gzip_chunks(chunks)
+    return chunks
+
+
+def add_export_routes(app: FastAPI, store: TransactionStore):
+    """Add the bulk export route to the main FastAPI app"""
+
+    @app.get("/export")
+    def export(
+        format: str = "ndjson",
+        gzip: bool = False,
+        start_unix: Optional[int] = None,
+        end_unix: Optional[int] = None,
+        start_id: Optional[str] = None,
+        end_id: Optional[str] = None,
+        start_ns: Optional[int] = None,
+        end_ns: Optional[int] = None
+    ):
+        """
+        Stream transaction records for a range (free endpoint)
+
+        Ranges are half-open: start is inclusive, end is exclusive.
+        The body is generated in a worker thread and only advances as fast
+        as the client reads it, so large exports use bounded memory and
+        never block the event loop that serves /timestamp.
+        """
+        if format not in MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+
+        body = export_stream(store, format, gzip, start_unix, end_unix, start_id, end_id, start_ns, end_ns)
+
+        filename = f"transactions.{format}" + (".gz" if gzip else "")
+        headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+        media_type = MEDIA_TYPES[format]
+        if gzip:
+            media_type = "application/gzip"
+
+        return StreamingResponse(body, media_type=media_type, headers=headers)
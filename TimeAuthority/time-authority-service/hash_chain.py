@@ -0,0 +1,601 @@
+"""
+Hash Chain - Tamper-evident linking of transaction records and their updates
+Records and update journal entries each carry their predecessor's hash; signed
+checkpoints pin both chain heads so audits only re-check what was added since
+"""
+
+from archive import ColdArchive, TieredTransactionStore
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+from transaction_store import TransactionStore, open_store
+from typing import Dict, List, Optional
+import argparse
+import codec
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Hash used as prev_hash by the first chained record (or update) of an empty log
+GENESIS_HASH = "0" * 64
+
+# What a damaged record or journal entry raises when it is decoded
+DECODE_ERRORS = (ValueError, KeyError, TypeError, AttributeError)
+
+# Stands in for a field a record did not have when it was appended
+_ABSENT = object()
+
+
+def _digest(obj) -> str:
+    canonical = json.dumps(obj, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def record_hash(transaction: Dict) -> str:
+    """
+    SHA-256 over the canonical JSON of a record as it was appended
+
+    The record is hashed as the store will read it back: orjson decodes
+    integers wider than 64 bits as floats and writes NaN and infinities
+    as null, so hashing the in-memory dict would not match an audit.
+    """
+    return _digest(codec.loads(codec.dumps_bytes(transaction)))
+
+
+def update_hash(entry: Dict) -> str:
+    """SHA-256 over the canonical JSON of an update journal entry, as stored (see record_hash)"""
+    entry = {key: entry.get(key) for key in ("transaction_id", "fields", "previous", "prev_hash")}
+    return _digest(codec.loads(codec.dumps_bytes(entry)))
+
+
+def _fold_originals(originals: Dict, entry: Dict):
+    # The first entry to touch a field says what it held when appended
+    previous = entry.get("previous") or {}
+    for field in entry["fields"]:
+        originals.setdefault(field, previous.get(field, _ABSENT))
+
+
+def as_appended(transaction: Dict, originals: Optional[Dict]) -> Dict:
+    """
+    Undo the updates made to a record
+
+    originals maps each updated field to the value it had when the record
+    was appended, as collected from the update journal.
+    """
+    if not originals:
+        return transaction
+    appended = dict(transaction)
+    for field, value in originals.items():
+        if value is _ABSENT:
+            appended.pop(field, None)
+        else:
+            appended[field] = value
+    return appended
+
+
+def public_key_path(key_path: str) -> str:
+    """Where the public half of the checkpoint key at key_path is written"""
+    return os.path.splitext(key_path)[0] + ".pub"
+
+
+def load_checkpoint_key(path: str) -> Ed25519PrivateKey:
+    """
+    Return the Ed25519 key for signing checkpoints
+
+    Uses the CHECKPOINT_KEY environment variable (a hex-encoded 32-byte
+    seed) if set, otherwise a key kept in path (created on first use).
+    The public key is written to public_key_path(path) for auditors.
+    """
+    seed = os.environ.get("CHECKPOINT_KEY")
+    if seed:
+        key = Ed25519PrivateKey.from_private_bytes(bytes.fromhex(seed))
+    else:
+        if not os.path.exists(path):
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(Ed25519PrivateKey.generate().private_bytes(
+                    serialization.Encoding.PEM,
+                    serialization.PrivateFormat.PKCS8,
+                    serialization.NoEncryption()
+                ))
+        with open(path, 'rb') as f:
+            key = serialization.load_pem_private_key(f.read(), password=None)
+    public_pem = key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    pub_path = public_key_path(path)
+    if os.path.exists(pub_path):
+        with open(pub_path, 'rb') as f:
+            if f.read() == public_pem:
+                return key
+    with open(pub_path, 'wb') as f:
+        f.write(public_pem)
+    return key
+
+
+def load_public_key(path: str) -> Ed25519PublicKey:
+    """Read a checkpoint public key written by load_checkpoint_key()"""
+    with open(path, 'rb') as f:
+        return serialization.load_pem_public_key(f.read())
+
+
+class CheckpointLog:
+    """
+    Append-only JSONL file of signed chain-head checkpoints
+
+    Each checkpoint records how many records and update journal entries
+    there were, the head hash of each chain, and an Ed25519 signature.
+    Writing needs the private key; verifying needs only the public key,
+    so an auditor holds nothing that could sign a forged checkpoint.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        private_key: Optional[Ed25519PrivateKey] = None,
+        public_key: Optional[Ed25519PublicKey] = None
+    ):
+        self.path = path
+        self.private_key = private_key
+        self.public_key = public_key or (private_key.public_key() if private_key else None)
+
+    @staticmethod
+    def _message(checkpoint: Dict) -> bytes:
+        return "{sequence}:{head_hash}:{update_sequence}:{update_head_hash}:{timestamp_ns}".format(**checkpoint).encode()
+
+    def write(
+        self,
+        sequence: int,
+        head_hash: str,
+        update_sequence: int = 0,
+        update_head_hash: str = GENESIS_HASH
+    ) -> Dict:
+        checkpoint = {
+            "sequence": sequence,
+            "head_hash": head_hash,
+            "update_sequence": update_sequence,
+            "update_head_hash": update_head_hash,
+            "timestamp_ns": time.time_ns()
+        }
+        checkpoint["signature"] = self.private_key.sign(self._message(checkpoint)).hex()
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(checkpoint) + "\n")
+        return checkpoint
+
+    def verify(self, checkpoint: Dict) -> bool:
+        try:
+            self.public_key.verify(bytes.fromhex(checkpoint["signature"]), self._message(checkpoint))
+        except (InvalidSignature, ValueError, KeyError):
+            return False
+        return True
+
+    def read(self) -> List[Dict]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r') as f:
+            return [json.loads(line) for line in f if line.endswith("\n") and line.strip()]
+
+
+class HashChain:
+    """
+    Links records and updates as they are written and checkpoints both heads
+
+    All appends must go through append() (or enqueue() and commit()), and
+    all updates through update(), so that linking and writing happen in
+    the same order. Records queued while another thread is writing are
+    linked and written together in one append_many call (group commit).
+    """
+
+    def __init__(self, store: TransactionStore, checkpoints: CheckpointLog, interval: int = 1000):
+        self.store = store
+        self.checkpoints = checkpoints
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._queue_lock = threading.Lock()
+        self._queue = []
+        # Replay the journal for its head, and for what the newest record
+        # held when it was appended in case it has been updated since
+        last = store.last()
+        originals = {}
+        self.update_sequence = 0
+        self.update_head_hash = GENESIS_HASH
+        for _, entry in store.tail_updates():
+            self.update_sequence += 1
+            self.update_head_hash = update_hash(entry)
+            if last and entry["transaction_id"] == last["transaction_id"]:
+                _fold_originals(originals, entry)
+        self.head_hash = record_hash(as_appended(last, originals)) if last else GENESIS_HASH
+        self.sequence = store.aggregate()["count"]
+
+    def enqueue(self, transaction: Dict) -> Dict:
+        """Queue a record for the next commit; returns a ticket for commit()"""
+        ticket = {"transaction": transaction, "done": False, "error": None}
+        with self._queue_lock:
+            self._queue.append(ticket)
+        return ticket
+
+    def commit(self, ticket: Dict):
+        """
+        Block until the ticket's record is written
+
+        The first caller to get the lock writes everything queued so far;
+        callers whose records went out in that batch return without
+        writing. Raises the store's error if the batch failed.
+        """
+        with self._lock:
+            if not ticket["done"]:
+                self._write_queued()
+        if ticket["error"] is not None:
+            raise ticket["error"]
+
+    def append(self, transaction: Dict):
+        """Set prev_hash on the record, append it and advance the head"""
+        self.commit(self.enqueue(transaction))
+
+    def _write_queued(self):
+        with self._queue_lock:
+            batch, self._queue = self._queue, []
+        head_hash = self.head_hash
+        sequence = self.sequence
+        due = []
+        for ticket in batch:
+            transaction = ticket["transaction"]
+            transaction["prev_hash"] = head_hash
+            head_hash = record_hash(transaction)
+            sequence += 1
+            if self.interval and sequence % self.interval == 0:
+                due.append((sequence, head_hash))
+        try:
+            self.store.append_many([ticket["transaction"] for ticket in batch])
+        except Exception as e:
+            # Nothing was linked in; the head stays where it was
+            for ticket in batch:
+                ticket["done"] = True
+                ticket["error"] = e
+            return
+        self.head_hash = head_hash
+        self.sequence = sequence
+        for checkpoint_sequence, checkpoint_hash in due:
+            self.checkpoints.write(checkpoint_sequence, checkpoint_hash, self.update_sequence, self.update_head_hash)
+        for ticket in batch:
+            ticket["done"] = True
+
+    def update(self, transaction_id: str, fields: Dict) -> bool:
+        """Merge fields into a record, linking the change into the update journal"""
+        with self._lock:
+            entry = self.store.update(transaction_id, fields, prev_hash=self.update_head_hash)
+            if entry is None:
+                return False
+            self.update_head_hash = update_hash(entry)
+            self.update_sequence += 1
+            return True
+
+    def checkpoint(self) -> Dict:
+        """Write a checkpoint of the current heads immediately"""
+        with self._lock:
+            return self.checkpoints.write(self.sequence, self.head_hash, self.update_sequence, self.update_head_hash)
+
+
+# Audit progress before anything has been verified
+_FRESH_STATE = {
+    "position": 0,
+    "previous_position": 0,
+    "sequence": 0,
+    "head_hash": GENESIS_HASH,
+    "chained": False,
+    "update_position": 0,
+    "update_sequence": 0,
+    "update_head_hash": GENESIS_HASH,
+    "updates_chained": False
+}
+
+
+class _JournalReplay:
+    """
+    Reads the update journal for an audit, checking its links
+
+    Keeps, per transaction ID, what each updated field held when the
+    record was appended and every value the journal has given it since,
+    plus the journal head at each sequence a checkpoint names. read() can
+    be called again to pick up entries written while the audit runs.
+    """
+
+    def __init__(self, store: TransactionStore, state: Dict, wanted: set):
+        self.store = store
+        self.position = state["update_position"]
+        self.sequence = state["update_sequence"]
+        self.head_hash = state["update_head_hash"]
+        self.chained = state["updates_chained"]
+        self.wanted = wanted
+        self.heads = {self.sequence: (self.position, self.head_hash, self.chained)}
+        self.originals: Dict[str, Dict] = {}
+        self.values: Dict[str, Dict[str, List]] = {}
+        self.checked = 0
+        self.broken = None
+
+    def _fail(self, reason: str, **details):
+        self.broken = dict(reason=reason, update_sequence=self.sequence + 1, update_position=self.position)
+        self.broken.update(details)
+
+    def read(self) -> bool:
+        """Read entries written since the last call; True if there were any"""
+        if self.broken:
+            return False
+        checked = self.checked
+        entries = self.store.tail_updates(self.position)
+        try:
+            while True:
+                try:
+                    item = next(entries, None)
+                    if item is None:
+                        break
+                    next_position, entry = item
+                    transaction_id = entry["transaction_id"]
+                    fields = dict(entry["fields"])
+                except DECODE_ERRORS as e:
+                    self._fail("unparseable update", error=str(e))
+                    break
+                prev_hash = entry.get("prev_hash")
+                if prev_hash is None and not self.chained:
+                    # Legacy entry written before updates were chained
+                    pass
+                elif prev_hash != self.head_hash:
+                    self._fail(
+                        "update prev_hash mismatch",
+                        transaction_id=transaction_id,
+                        expected_prev_hash=self.head_hash,
+                        found_prev_hash=prev_hash
+                    )
+                    break
+                else:
+                    self.chained = True
+                self.sequence += 1
+                self.checked += 1
+                self.head_hash = update_hash(entry)
+                self.position = next_position
+                _fold_originals(self.originals.setdefault(transaction_id, {}), entry)
+                values = self.values.setdefault(transaction_id, {})
+                for field, value in fields.items():
+                    values.setdefault(field, []).append(value)
+                if self.sequence in self.wanted:
+                    self.heads[self.sequence] = (self.position, self.head_hash, self.chained)
+        finally:
+            entries.close()
+        return self.checked > checked
+
+    def appended_hash(self, transaction: Dict) -> str:
+        """Hash of the record as it was appended, before any journaled update"""
+        return record_hash(as_appended(transaction, self.originals.get(transaction["transaction_id"])))
+
+    def disagreement(self, transaction: Dict) -> Optional[str]:
+        """Name an updated field holding a value the journal never gave it"""
+        transaction_id = transaction["transaction_id"]
+        originals = self.originals.get(transaction_id)
+        if not originals:
+            return None
+        for field, values in self.values[transaction_id].items():
+            value = transaction.get(field, _ABSENT)
+            if value != originals[field] and value not in values:
+                return field
+        return None
+
+
+def audit(
+    store: TransactionStore,
+    checkpoints: CheckpointLog,
+    state_path: Optional[str] = None,
+    full: bool = False
+) -> Dict:
+    """
+    Verify the record chain and update journal, resuming after the last verified checkpoint
+
+    Progress is saved to state_path each time a checkpoint verifies, so
+    the next run only reads what was written after it. Before resuming,
+    the last verified record is read back and re-hashed, so a log that
+    was truncated or rewritten behind the saved position still fails.
+    Returns a report; on failure "broken" describes the first bad link
+    found, including the store position to pass to tail() (or, for the
+    journal, tail_updates()) to read the offending entry.
+    """
+    state = dict(_FRESH_STATE)
+    if state_path and not full and os.path.exists(state_path):
+        with open(state_path, 'r') as f:
+            saved = json.load(f)
+        # Progress saved in an older format is redone from the start
+        if saved.keys() >= _FRESH_STATE.keys():
+            state = saved
+
+    pending = sorted(
+        (cp for cp in checkpoints.read() if cp["sequence"] > state["sequence"]),
+        key=lambda cp: cp["sequence"]
+    )
+    start = time.perf_counter()
+    journal = _JournalReplay(store, state, {cp.get("update_sequence") for cp in pending})
+    position = state["position"]
+    previous_position = state["previous_position"]
+    sequence = state["sequence"]
+    head_hash = state["head_hash"]
+    chained = state["chained"]
+    checked = 0
+    verified_checkpoints = 0
+    report = {"ok": True, "resumed_from_sequence": state["sequence"]}
+
+    def fail(reason: str, **details):
+        report["ok"] = False
+        report["broken"] = dict(reason=reason, sequence=sequence, position=position)
+        report["broken"].update(details)
+
+    # Updates come first: re-hashing a record needs what its updated
+    # fields held when it was appended
+    journal.read()
+
+    previous = None
+    if not journal.broken and state["sequence"]:
+        count = store.aggregate()["count"]
+        if count < state["sequence"]:
+            fail("records missing before last verified checkpoint", record_count=count)
+        else:
+            records = store.tail(previous_position)
+            try:
+                item = next(records, None)
+            except DECODE_ERRORS as e:
+                item = None
+                fail("unparseable record", position=previous_position, error=str(e))
+            finally:
+                records.close()
+            if report["ok"] and (item is None or item[0] != position):
+                fail("last verified record missing", position=previous_position)
+            elif report["ok"]:
+                previous = item[1]
+                if journal.appended_hash(previous) != head_hash and not (
+                    journal.read() and journal.appended_hash(previous) == head_hash
+                ):
+                    fail(
+                        "last verified record changed",
+                        position=previous_position,
+                        transaction_id=previous.get("transaction_id")
+                    )
+
+    records = store.tail(position)
+    try:
+        while report["ok"] and not journal.broken:
+            try:
+                item = next(records, None)
+            except DECODE_ERRORS as e:
+                sequence += 1
+                fail("unparseable record", error=str(e))
+                break
+            if item is None:
+                break
+            next_position, transaction = item
+            sequence += 1
+            checked += 1
+            prev_hash = transaction.get("prev_hash")
+            if prev_hash is None and not chained:
+                # Legacy record written before chaining was enabled
+                pass
+            else:
+                if prev_hash != head_hash and previous is not None and journal.read():
+                    # The previous record may have been updated after the journal was read
+                    head_hash = journal.appended_hash(previous)
+                if prev_hash != head_hash:
+                    fail(
+                        "prev_hash mismatch",
+                        transaction_id=transaction.get("transaction_id"),
+                        expected_prev_hash=head_hash,
+                        found_prev_hash=prev_hash
+                    )
+                    break
+                chained = True
+            field = journal.disagreement(transaction)
+            if field and journal.read():
+                field = journal.disagreement(transaction)
+            if field:
+                fail(
+                    "record disagrees with update journal",
+                    transaction_id=transaction.get("transaction_id"),
+                    field=field,
+                    value=transaction.get(field)
+                )
+                break
+            head_hash = journal.appended_hash(transaction)
+            previous_position, position = position, next_position
+            previous = transaction
+
+            while pending and pending[0]["sequence"] == sequence:
+                checkpoint = pending.pop(0)
+                if not checkpoints.verify(checkpoint):
+                    fail("checkpoint signature invalid", checkpoint=checkpoint)
+                    break
+                if checkpoint["head_hash"] != head_hash and journal.read():
+                    head_hash = journal.appended_hash(transaction)
+                if checkpoint["head_hash"] != head_hash:
+                    fail(
+                        "checkpoint head mismatch",
+                        transaction_id=transaction.get("transaction_id"),
+                        checkpoint=checkpoint,
+                        computed_head_hash=head_hash
+                    )
+                    break
+                update_head = journal.heads.get(checkpoint["update_sequence"])
+                if update_head is None and journal.read():
+                    update_head = journal.heads.get(checkpoint["update_sequence"])
+                if update_head is None:
+                    fail("updates missing before checkpoint", checkpoint=checkpoint)
+                    break
+                if update_head[1] != checkpoint["update_head_hash"]:
+                    fail(
+                        "checkpoint update head mismatch",
+                        checkpoint=checkpoint,
+                        computed_update_head_hash=update_head[1]
+                    )
+                    break
+                verified_checkpoints += 1
+                if state_path:
+                    _save_state(state_path, {
+                        "position": position,
+                        "previous_position": previous_position,
+                        "sequence": sequence,
+                        "head_hash": head_hash,
+                        "chained": chained,
+                        "update_position": update_head[0],
+                        "update_sequence": checkpoint["update_sequence"],
+                        "update_head_hash": update_head[1],
+                        "updates_chained": update_head[2]
+                    })
+    finally:
+        records.close()
+
+    if report["ok"] and journal.broken:
+        report["ok"] = False
+        report["broken"] = journal.broken
+    if report["ok"] and pending:
+        fail("records missing before checkpoint", checkpoint=pending[0])
+
+    elapsed = time.perf_counter() - start
+    report.update({
+        "records_checked": checked,
+        "updates_checked": journal.checked,
+        "checkpoints_verified": verified_checkpoints,
+        "head_sequence": sequence,
+        "head_hash": head_hash,
+        "update_sequence": journal.sequence,
+        "update_head_hash": journal.head_hash,
+        "seconds": round(elapsed, 3)
+    })
+    return report
+
+
+def _save_state(path: str, state: Dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Audit the Time Authority transaction hash chain")
+    parser.add_argument("--store", default=os.environ.get("TRANSACTION_STORE", "jsonl"))
+    parser.add_argument("--log", default=os.environ.get("TRANSACTION_LOG"))
+    parser.add_argument("--archive", default=os.environ.get("TRANSACTION_ARCHIVE", "transaction_archive.blocks"))
+    parser.add_argument("--checkpoints", default=os.environ.get("CHECKPOINT_LOG", "checkpoints.jsonl"))
+    parser.add_argument("--public-key", default=os.environ.get("CHECKPOINT_PUBLIC_KEY", "checkpoint.pub"),
+                        help="Key to verify checkpoints with; use a copy kept off the server")
+    parser.add_argument("--state", default="audit_state.json", help="Where to record audit progress")
+    parser.add_argument("--full", action="store_true", help="Ignore saved progress and audit from the start")
+    args = parser.parse_args()
+
+    log_path = args.log or ("transactions.db" if args.store == "sqlite" else "transaction_log.jsonl")
+    store = open_store(args.store, log_path)
+    if os.path.exists(args.archive + ".index"):
+        store = TieredTransactionStore(store, ColdArchive(args.archive))
+    result = audit(
+        store,
+        CheckpointLog(args.checkpoints, public_key=load_public_key(args.public_key)),
+        state_path=args.state,
+        full=args.full
+    )
+    print(json.dumps(result, indent=2))
+    raise SystemExit(0 if result["ok"] else 1)
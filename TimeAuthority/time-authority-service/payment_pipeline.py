@@ -0,0 +1,221 @@
+"""
+Payment Confirmation Pipeline - Verify x402 payments off the request path
+Stamps are issued as pending; a worker pool confirms payments in the background
+"""
+
+from transaction_store import TransactionStore
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+import codec
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Payment status values written to transaction records
+PAYMENT_PENDING = "pending"
+PAYMENT_CONFIRMED = "confirmed"
+PAYMENT_FAILED = "failed"
+
+# payment_error of a pending stamp whose confirmation job no longer exists
+PAYMENT_JOB_LOST = "payment confirmation job lost"
+
+
+class PaymentQueue:
+    """
+    Durable FIFO of payments awaiting confirmation, backed by SQLite
+
+    Jobs survive restarts: anything claimed by a worker that never finished
+    is handed out again the next time the queue is opened.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS payment_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id TEXT NOT NULL,
+            payment_data TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            not_before REAL NOT NULL DEFAULT 0,
+            claimed INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_payment_jobs_ready ON payment_jobs (claimed, not_before);
+    """
+
+    _INSERT = "INSERT INTO payment_jobs (transaction_id, payment_data) VALUES (?, ?)"
+    _SELECT_READY = (
+        "SELECT id, transaction_id, payment_data, attempts FROM payment_jobs "
+        "WHERE claimed = 0 AND not_before <= ? ORDER BY id LIMIT 1"
+    )
+    _CLAIM = "UPDATE payment_jobs SET claimed = 1 WHERE id = ?"
+    _DELETE = "DELETE FROM payment_jobs WHERE id = ?"
+    _RETRY = "UPDATE payment_jobs SET claimed = 0, attempts = ?, not_before = ? WHERE id = ?"
+    _RELEASE_ALL = "UPDATE payment_jobs SET claimed = 0 WHERE claimed = 1"
+    _COUNT = "SELECT COUNT(*) FROM payment_jobs"
+    _SELECT_IDS = "SELECT DISTINCT transaction_id FROM payment_jobs"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # As in the SQLite store: WAL commits without an fsync each, and a
+        # job lost to a power cut is failed by fail_orphaned_payments()
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self._SCHEMA)
+        # Jobs claimed by a previous process never completed; retry them
+        self._conn.execute(self._RELEASE_ALL)
+
+    def put(self, transaction_id: str, payment_data: Dict):
+        """Enqueue a payment for confirmation"""
+        with self._ready:
+            self._conn.execute(self._INSERT, (transaction_id, codec.dumps(payment_data)))
+            self._ready.notify()
+
+    def claim(self, timeout: float) -> Optional[Tuple[int, str, Dict, int]]:
+        """
+        Claim the oldest ready job, waiting up to timeout seconds
+
+        Returns (job_id, transaction_id, payment_data, attempts) or None.
+        """
+        deadline = time.monotonic() + timeout
+        with self._ready:
+            while True:
+                row = self._conn.execute(self._SELECT_READY, (time.time(),)).fetchone()
+                if row:
+                    self._conn.execute(self._CLAIM, (row[0],))
+                    return row[0], row[1], codec.loads(row[2]), row[3]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._ready.wait(remaining)
+
+    def complete(self, job_id: int):
+        """Remove a finished job"""
+        with self._lock:
+            self._conn.execute(self._DELETE, (job_id,))
+
+    def retry(self, job_id: int, attempts: int, delay: float):
+        """Return a job to the queue, not to be retried for delay seconds"""
+        with self._lock:
+            self._conn.execute(self._RETRY, (attempts, time.time() + delay, job_id))
+
+    def transaction_ids(self) -> Set[str]:
+        """IDs of every queued or claimed job"""
+        with self._lock:
+            return {row[0] for row in self._conn.execute(self._SELECT_IDS)}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(self._COUNT).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def fail_orphaned_payments(store: TransactionStore, records: Iterable[Dict], queued: Set[str]) -> int:
+    """
+    Mark pending records that have no queued confirmation job as failed
+
+    A crash between logging a stamp and queueing its job, a lost queue
+    file or a switch back to sync mode leaves a stamp pending with nothing
+    to resolve it, and pending records are never archived. records must
+    be read after queued was taken, so a job that completes in between has
+    already written its outcome. Returns how many records were failed.
+    """
+    failed = 0
+    for transaction in records:
+        transaction_id = transaction["transaction_id"]
+        if transaction.get("payment_status") != PAYMENT_PENDING or transaction_id in queued:
+            continue
+        logger.warning("Payment for %s has no confirmation job; marking it failed", transaction_id)
+        store.update(transaction_id, {
+            "payment_verified": False,
+            "payment_status": PAYMENT_FAILED,
+            "payment_error": PAYMENT_JOB_LOST
+        })
+        failed += 1
+    return failed
+
+
+class PaymentConfirmationPool:
+    """
+    Background workers that confirm queued payments and record the outcome
+
+    verify is called with the X-Payment data and returns a dict with a
+    "verified" key (the shape of X402PaymentVerifier.verify_payment).
+    Outcomes are written with store.update(); the service passes its
+    HashChain so they are linked into the update journal.
+    A rejected payment is final; an exception is retried with backoff,
+    and so is an outcome the store could not record (the job is kept).
+    """
+
+    def __init__(
+        self,
+        store: TransactionStore,
+        queue: PaymentQueue,
+        verify: Callable[[Dict], Dict],
+        workers: int = 4,
+        max_attempts: int = 5,
+        retry_delay: float = 2.0
+    ):
+        self.store = store
+        self.queue = queue
+        self.verify = verify
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._stop = threading.Event()
+        self._threads = []
+
+    def submit(self, transaction_id: str, payment_data: Dict):
+        """Queue a freshly issued stamp for payment confirmation"""
+        self.queue.put(transaction_id, payment_data)
+
+    def reconcile(self, records: Iterable[Dict]) -> int:
+        """Fail pending records without a queued job (see fail_orphaned_payments)"""
+        return fail_orphaned_payments(self.store, records, self.queue.transaction_ids())
+
+    def start(self):
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"payment-confirm-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        while not self._stop.is_set():
+            job = self.queue.claim(timeout=0.5)
+            if job:
+                self._process(*job)
+
+    def _process(self, job_id: int, transaction_id: str, payment_data: Dict, attempts: int):
+        attempts += 1
+        try:
+            result = self.verify(payment_data)
+        except Exception as e:
+            if attempts < self.max_attempts:
+                self.queue.retry(job_id, attempts, self.retry_delay * 2 ** (attempts - 1))
+                return
+            result = {"verified": False, "error": str(e)}
+
+        verified = bool(result.get("verified"))
+        fields = {
+            "payment_verified": verified,
+            "payment_status": PAYMENT_CONFIRMED if verified else PAYMENT_FAILED,
+        }
+        if not verified and result.get("error"):
+            fields["payment_error"] = result["error"]
+        if not self.store.update(transaction_id, fields):
+            logger.error("Payment outcome for %s not recorded: transaction not found; keeping the job", transaction_id)
+            self.queue.retry(job_id, attempts, self.retry_delay * 2 ** min(attempts - 1, 10))
+            return
+        self.queue.complete(job_id)
@@ -0,0 +1,372 @@
+"""
+Replication - Ship the transaction log from a primary to read-only followers
+The primary streams records and updates as NDJSON; a follower applies them
+to its own store and resumes from its last applied position after a disconnect
+"""
+
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from transaction_store import TransactionStore, record_timestamp_ns
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import codec
+import hmac
+import httpx
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# How often the primary checks for new data, and the longest it stays
+# silent on an idle connection before sending a heartbeat
+POLL_INTERVAL = 0.2
+HEARTBEAT_INTERVAL = 1.0
+
+# Streams end after this long and the follower reconnects from its
+# position; an open stream would otherwise hold up a graceful shutdown
+STREAM_MAX_SECONDS = 15.0
+
+# Most records (and updates) read per round; a follower catching up
+# receives the backlog in rounds of this size
+STREAM_BATCH = 5000
+
+# Longest a follower waits between reconnect attempts after repeated failures
+MAX_RETRY_DELAY = 30.0
+
+
+def _read_round(
+    store: TransactionStore,
+    record_position: int,
+    update_position: int,
+    limit: int
+) -> Tuple[List[bytes], int, int, bool]:
+    """
+    Read one round of the stream: up to limit new records, then updates
+
+    Updates are collected before records are read, so every update refers
+    to a record already sent. When the records were cut off at limit the
+    updates are held back for a later round. Returns the lines, the new
+    positions and whether the stream has caught up with the log.
+    """
+    updates = []
+    for position, entry in store.tail_updates(update_position):
+        updates.append((position, entry))
+        if len(updates) >= limit:
+            break
+
+    lines = []
+    for record_position, transaction in store.tail(record_position):
+        lines.append(codec.dumps_bytes({"type": "record", "position": record_position, "record": transaction}))
+        if len(lines) >= limit:
+            break
+
+    caught_up = len(lines) < limit
+    if caught_up:
+        for update_position, entry in updates:
+            lines.append(codec.dumps_bytes({
+                "type": "update",
+                "position": update_position,
+                "transaction_id": entry["transaction_id"],
+                "fields": entry["fields"],
+                "prev_hash": entry.get("prev_hash")
+            }))
+        caught_up = len(updates) < limit
+    return lines, record_position, update_position, caught_up
+
+
+async def replication_stream(
+    store: TransactionStore,
+    record_position: int = 0,
+    update_position: int = 0,
+    poll_interval: float = POLL_INTERVAL,
+    heartbeat_interval: float = HEARTBEAT_INTERVAL,
+    max_seconds: float = STREAM_MAX_SECONDS,
+    batch: int = STREAM_BATCH
+) -> AsyncIterator[bytes]:
+    """
+    Stream everything appended after the given positions, then follow new writes
+
+    Each round sends new records, then updates, then a heartbeat carrying
+    the positions reached and the primary's clock. Heartbeats are only sent
+    once the stream has caught up, so a follower still working through a
+    backlog sees its lag grow. Store reads run in the threadpool and the
+    waits between rounds on the event loop, so an idle stream holds no
+    worker thread. The stream ends after max_seconds.
+    """
+    deadline = time.monotonic() + max_seconds
+    last_sent = 0.0
+    while True:
+        lines, record_position, update_position, caught_up = await run_in_threadpool(
+            _read_round, store, record_position, update_position, batch
+        )
+        now = time.monotonic()
+        expired = now >= deadline
+        if caught_up and (lines or expired or now - last_sent >= heartbeat_interval):
+            lines.append(codec.dumps_bytes({
+                "type": "heartbeat",
+                "record_position": record_position,
+                "update_position": update_position,
+                "time_ns": time.time_ns()
+            }))
+            last_sent = now
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+        if expired:
+            return
+        if caught_up:
+            await asyncio.sleep(poll_interval)
+
+
+def add_replication_routes(app: FastAPI, store: TransactionStore, replication_token: Optional[str]):
+    """Add the log-shipping stream that followers connect to (requires replication_token)"""
+
+    @app.get("/replication/stream", include_in_schema=False)
+    async def stream(
+        record_position: int = 0,
+        update_position: int = 0,
+        x_replication_token: Optional[str] = Header(None)
+    ):
+        """Stream records and updates after the given positions (NDJSON)"""
+        if not replication_token:
+            raise HTTPException(status_code=403, detail="Replication is disabled (set REPLICATION_TOKEN)")
+        if not x_replication_token or not hmac.compare_digest(x_replication_token, replication_token):
+            raise HTTPException(status_code=401, detail="Invalid replication token")
+        return StreamingResponse(
+            replication_stream(store, record_position, update_position),
+            media_type="application/x-ndjson"
+        )
+
+
+class ReplicationFollower:
+    """
+    Tail a primary's replication stream into a local store
+
+    Records are appended in batches without re-linking the hash chain,
+    since they already carry the primary's prev_hash. Applied positions
+    are saved to state_path after every batch so a restart or dropped
+    connection resumes where it left off. Before a batch or an update is
+    applied, state_path also names it ("applying"); after a crash in
+    between, the store is checked to see whether it landed, so nothing
+    is applied twice and nothing is skipped.
+    """
+
+    def __init__(
+        self,
+        store: TransactionStore,
+        primary_url: str,
+        state_path: str,
+        replication_token: Optional[str] = None,
+        batch_size: int = 500,
+        retry_delay: float = 1.0
+    ):
+        self.store = store
+        self.primary_url = primary_url.rstrip("/")
+        self.state_path = state_path
+        self.replication_token = replication_token
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.record_position = 0
+        self.update_position = 0
+        self.connected = False
+        self.primary_time_ns = None
+        self.applied_at_ns = None
+        self.records_applied = 0
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+        if os.path.exists(state_path):
+            with open(state_path, 'r') as f:
+                state = codec.loads(f.read())
+            self.record_position = state["record_position"]
+            self.update_position = state["update_position"]
+            if state.get("applying"):
+                self._recover(state["applying"])
+
+    def _recover(self, applying: Dict):
+        # The last run stopped between applying a batch or update and
+        # saving its position; it is applied if the store ends with it
+        if applying["type"] == "records":
+            last = self.store.last()
+            if last and last["transaction_id"] == applying["last_id"] and record_timestamp_ns(last) == applying["last_ns"]:
+                self.record_position = applying["position"]
+        else:
+            last = None
+            for _, entry in self.store.tail_updates(0):
+                last = entry
+            if last and all(last.get(key) == applying[key] for key in ("transaction_id", "fields", "prev_hash")):
+                self.update_position = applying["position"]
+        self._save_state()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="replication-follower", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        # The stream thread notices within one heartbeat interval
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def lag_seconds(self) -> Optional[float]:
+        """
+        How far this follower trails the primary
+
+        While connected this is the delay between the primary reporting its
+        position and the follower having applied everything up to it, plus
+        any silence beyond the expected heartbeat interval, so a stalled
+        stream shows up as growing lag. When disconnected it grows with the
+        time since that last report.
+        """
+        if self.primary_time_ns is None:
+            return None
+        now_ns = time.time_ns()
+        if self.connected:
+            lag_ns = self.applied_at_ns - self.primary_time_ns
+            lag_ns += max(0, now_ns - self.applied_at_ns - int(HEARTBEAT_INTERVAL * 1e9))
+        else:
+            lag_ns = now_ns - self.primary_time_ns
+        return max(0.0, lag_ns / 1e9)
+
+    def status(self) -> Dict:
+        lag = self.lag_seconds()
+        return {
+            "role": "follower",
+            "primary": self.primary_url,
+            "connected": self.connected,
+            "lag_seconds": round(lag, 3) if lag is not None else None,
+            "record_position": self.record_position,
+            "update_position": self.update_position,
+            "records_applied": self.records_applied,
+            "last_error": self.last_error
+        }
+
+    def _save_state(self, applying: Optional[Dict] = None):
+        state = {"record_position": self.record_position, "update_position": self.update_position}
+        if applying:
+            state["applying"] = applying
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(codec.dumps(state))
+        os.replace(tmp_path, self.state_path)
+
+    def _flush(self, records: List[Dict], record_position: int):
+        self._save_state({
+            "type": "records",
+            "position": record_position,
+            "last_id": records[-1]["transaction_id"],
+            "last_ns": record_timestamp_ns(records[-1])
+        })
+        self.store.append_many(records)
+        self.records_applied += len(records)
+        self.record_position = record_position
+        self._save_state()
+
+    def _apply_update(self, message: Dict):
+        entry = {key: message.get(key) for key in ("transaction_id", "fields", "prev_hash")}
+        self._save_state(dict(entry, type="update", position=message["position"]))
+        # Keep the primary's journal links so the replica audits the same way
+        if not self.store.update(entry["transaction_id"], entry["fields"], entry["prev_hash"]):
+            logger.warning(
+                "Update from %s for %s matched no local record", self.primary_url, entry["transaction_id"]
+            )
+        self.update_position = message["position"]
+        self._save_state()
+
+    def _run(self):
+        headers = {"X-Replication-Token": self.replication_token} if self.replication_token else {}
+        failures = 0
+        with httpx.Client(headers=headers, timeout=httpx.Timeout(10.0, read=HEARTBEAT_INTERVAL * 10)) as client:
+            while not self._stop.is_set():
+                try:
+                    # A stream the primary ended cleanly is resumed at once
+                    self._follow(client)
+                    failures = 0
+                    continue
+                except Exception as e:
+                    # Anything else (a bad message, a full disk) must not
+                    # kill the thread while status still says connected
+                    self.connected = False
+                    self.last_error = f"{e.__class__.__name__}: {e}"
+                    failures += 1
+                delay = min(self.retry_delay * 2 ** (failures - 1), MAX_RETRY_DELAY)
+                logger.warning("Replication from %s failed (%s); retrying in %.1fs", self.primary_url, self.last_error, delay)
+                self._stop.wait(delay)
+            self.connected = False
+
+    def _follow(self, client: httpx.Client):
+        params = {"record_position": self.record_position, "update_position": self.update_position}
+        with client.stream("GET", f"{self.primary_url}/replication/stream", params=params) as response:
+            response.raise_for_status()
+            self.connected = True
+            self.last_error = None
+            batch = []
+            batch_position = self.record_position
+            for line in response.iter_lines():
+                if self._stop.is_set():
+                    break
+                if not line:
+                    continue
+                message = codec.loads(line)
+                kind = message["type"]
+                if kind == "record":
+                    batch.append(message["record"])
+                    batch_position = message["position"]
+                    if len(batch) >= self.batch_size:
+                        self._flush(batch, batch_position)
+                        batch = []
+                    continue
+                if batch:
+                    self._flush(batch, batch_position)
+                    batch = []
+                if kind == "update":
+                    self._apply_update(message)
+                elif kind == "heartbeat":
+                    self.primary_time_ns = message["time_ns"]
+                    self.applied_at_ns = time.time_ns()
+            if batch:
+                self._flush(batch, batch_position)
+
+
+class ReplicationLagMiddleware:
+    """ASGI middleware adding an X-Replication-Lag header (seconds) to every response"""
+
+    def __init__(self, app, follower: ReplicationFollower):
+        self.app = app
+        self.follower = follower
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_lag(message):
+            if message["type"] == "http.response.start":
+                lag = self.follower.lag_seconds()
+                value = "unknown" if lag is None else f"{lag:.3f}"
+                message.setdefault("headers", []).append((b"x-replication-lag", value.encode()))
+            await send(message)
+
+        await self.app(scope, receive, send_with_lag)
+
+
+def add_follower_routes(app: FastAPI, follower: ReplicationFollower):
+    """Run the follower with the app and report its lag on every response"""
+
+    app.add_middleware(ReplicationLagMiddleware, follower=follower)
+
+    @app.on_event("startup")
+    def start_follower():
+        follower.start()
+
+    @app.on_event("shutdown")
+    def stop_follower():
+        follower.stop()
+
+    @app.get("/replication/status")
+    async def replication_status():
+        """Follower connection state, applied positions and replication lag"""
+        return follower.status()
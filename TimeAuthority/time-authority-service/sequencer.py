@@ -0,0 +1,54 @@
+"""
+Timestamp Sequencer - Strictly increasing nanosecond timestamps
+Anchored to the wall clock, advanced by the monotonic clock
+"""
+
+import threading
+import time
+
+
+class TimestampSequencer:
+    """
+    Issue strictly increasing nanosecond Unix timestamps
+
+    Time advances with time.monotonic_ns(), so wall-clock steps (NTP
+    corrections, manual changes) never move issued timestamps backwards.
+    The anchor to the wall clock is refreshed every resync_ns; if the wall
+    clock has stepped back, the sequencer holds its position (advancing by
+    1ns per call) until real time catches up. Two calls never return the
+    same value, even within one clock tick.
+    """
+
+    def __init__(self, resync_ns: int = 60 * 1_000_000_000):
+        self.resync_ns = resync_ns
+        self._lock = threading.Lock()
+        self._last = 0
+        self._anchor()
+
+    def _anchor(self):
+        self._wall_base = time.time_ns()
+        self._mono_base = time.monotonic_ns()
+
+    def next_ns(self) -> int:
+        """Return a timestamp in nanoseconds greater than any returned before"""
+        with self._lock:
+            mono = time.monotonic_ns()
+            if mono - self._mono_base >= self.resync_ns:
+                self._anchor()
+                mono = self._mono_base
+            now = self._wall_base + (mono - self._mono_base)
+            if now <= self._last:
+                now = self._last + 1
+            self._last = now
+            return now
+
+    @property
+    def last_ns(self) -> int:
+        """Most recently issued timestamp (0 if none yet)"""
+        return self._last
+
+    def observe(self, timestamp_ns: int):
+        """Never issue a value at or below timestamp_ns (e.g. the newest stored record)"""
+        with self._lock:
+            if timestamp_ns > self._last:
+                self._last = timestamp_ns
@@ -0,0 +1,192 @@
+"""
+Shard Router - Thin front end for a sharded Time Authority cluster
+Routes each request to the shard owning its transaction ID, fans out
+hash lookups and aggregates stats; can also launch a local test cluster
+"""
+
+from fastapi import FastAPI, Request, Response, HTTPException
+from sharding import shard_for_id
+from typing import List
+import argparse
+import asyncio
+import httpx
+import itertools
+import os
+import signal
+import subprocess
+import sys
+import time
+
+# Base URLs of the shard nodes, in shard index order
+SHARD_URLS = [url.strip().rstrip("/") for url in os.environ.get("SHARD_URLS", "").split(",") if url.strip()]
+
+# Headers carried between agents and shards for the x402 flow
+FORWARDED_REQUEST_HEADERS = ("content-type", "x-payment")
+FORWARDED_RESPONSE_HEADERS = ("content-type", "x-payment-required", "x-payment-response")
+
+app = FastAPI(
+    title="Time Authority Router",
+    description="Routes requests across Time Authority shards",
+    version="1.0.0"
+)
+
+client = httpx.AsyncClient(timeout=10.0)
+_next_shard = itertools.count()
+
+
+def _relay(upstream: httpx.Response) -> Response:
+    headers = {k: v for k, v in upstream.headers.items() if k.lower() in FORWARDED_RESPONSE_HEADERS}
+    return Response(content=upstream.content, status_code=upstream.status_code, headers=headers)
+
+
+async def _get(url: str) -> httpx.Response:
+    try:
+        return await client.get(url)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=503, detail=f"Shard unavailable: {e.__class__.__name__}")
+
+
+async def _get_all(path: str) -> List[httpx.Response]:
+    return await asyncio.gather(*(_get(f"{url}{path}") for url in SHARD_URLS))
+
+
+@app.on_event("shutdown")
+async def close_client():
+    await client.aclose()
+
+
+@app.get("/")
+async def root():
+    """Router information"""
+    return {
+        "service": "Time Authority Router",
+        "shards": len(SHARD_URLS),
+        "endpoint": "/timestamp"
+    }
+
+
+@app.post("/timestamp")
+async def create_timestamp(request: Request):
+    """
+    Forward a stamp request to the next shard (round robin)
+
+    The chosen shard issues an ID from its own partition, so later
+    /verify calls route back to it.
+    """
+    url = SHARD_URLS[next(_next_shard) % len(SHARD_URLS)]
+    headers = {k: v for k, v in request.headers.items() if k.lower() in FORWARDED_REQUEST_HEADERS}
+    try:
+        upstream = await client.post(f"{url}/timestamp", content=await request.body(), headers=headers)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=503, detail=f"Shard unavailable: {e.__class__.__name__}")
+    return _relay(upstream)
+
+
+@app.get("/verify/hash/{document_hash}")
+async def verify_document_hash(document_hash: str):
+    """Ask every shard for a document hash and merge the matches"""
+    transactions = []
+    for upstream in await _get_all(f"/verify/hash/{document_hash}"):
+        if upstream.status_code == 200:
+            transactions.extend(upstream.json()["transactions"])
+        elif upstream.status_code != 404:
+            return _relay(upstream)
+    if not transactions:
+        raise HTTPException(status_code=404, detail="Document hash not found")
+    transactions.sort(key=lambda tx: tx.get("timestamp_ns", 0))
+    return {"verified": True, "transactions": transactions}
+
+
+@app.get("/verify/{transaction_id}")
+async def verify_timestamp(transaction_id: str):
+    """Route a transaction ID lookup to its owning shard"""
+    try:
+        shard = shard_for_id(transaction_id, len(SHARD_URLS))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Transaction ID not found")
+    return _relay(await _get(f"{SHARD_URLS[shard]}/verify/{transaction_id}"))
+
+
+@app.get("/stats")
+async def get_stats():
+    """Sum statistics across all shards"""
+    shards = []
+    for upstream in await _get_all("/stats"):
+        if upstream.status_code != 200:
+            return _relay(upstream)
+        shards.append(upstream.json())
+    return {
+        "total_timestamps": sum(s["total_timestamps"] for s in shards),
+        "total_revenue_usdc": round(sum(s["total_revenue_usdc"] for s in shards), 6),
+        "price_per_timestamp": shards[0].get("price_per_timestamp") if shards else None,
+        "payment_token": shards[0].get("payment_token") if shards else None,
+        "shards": shards
+    }
+
+
+def spawn_local_cluster(shards: int, port: int, data_dir: str):
+    """
+    Run N shard nodes plus the router as local processes (for testing)
+
+    Shard i listens on port + 1 + i and keeps its log and other state
+    in data_dir/shard-i.
+    """
+    service_dir = os.path.dirname(os.path.abspath(__file__))
+    processes = []
+    urls = []
+    for index in range(shards):
+        shard_dir = os.path.join(data_dir, f"shard-{index}")
+        os.makedirs(shard_dir, exist_ok=True)
+        shard_port = port + 1 + index
+        env = dict(os.environ, SHARD_INDEX=str(index), SHARD_COUNT=str(shards))
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "timestamp_service:app",
+             "--app-dir", service_dir, "--port", str(shard_port), "--log-level", "warning"],
+            cwd=shard_dir,
+            env=env
+        ))
+        urls.append(f"http://127.0.0.1:{shard_port}")
+
+    env = dict(os.environ, SHARD_URLS=",".join(urls))
+    processes.append(subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "shard_router:app",
+         "--app-dir", service_dir, "--port", str(port), "--log-level", "warning"],
+        cwd=service_dir,
+        env=env
+    ))
+
+    print(f"🌐 Router: http://127.0.0.1:{port}")
+    for index, url in enumerate(urls):
+        print(f"   Shard {index}: {url}  (data: {os.path.join(data_dir, f'shard-{index}')})")
+    print("Press Ctrl+C to stop the cluster")
+
+    def handle_sigterm(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    try:
+        while all(p.poll() is None for p in processes):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in processes:
+            p.terminate()
+        for p in processes:
+            p.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time Authority shard router")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--spawn", type=int, metavar="N", help="Also start N local shard nodes")
+    parser.add_argument("--data-dir", default="cluster", help="State directory for spawned shards")
+    args = parser.parse_args()
+
+    if args.spawn:
+        spawn_local_cluster(args.spawn, args.port, os.path.abspath(args.data_dir))
+    else:
+        if not SHARD_URLS:
+            parser.error("Set SHARD_URLS to the comma-separated shard base URLs, or use --spawn N")
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=args.port)
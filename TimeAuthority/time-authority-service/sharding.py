@@ -0,0 +1,33 @@
+"""
+Sharding - Partition the transaction ID space across service nodes
+Shard i of N owns every 8-digit transaction ID with int(id) % N == i
+"""
+
+import random
+
+MIN_TRANSACTION_ID = 10000000
+MAX_TRANSACTION_ID = 99999999
+
+
+def check_shard(shard_index: int, shard_count: int):
+    """Raise ValueError unless shard_index names one of shard_count shards"""
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise ValueError(
+            f"Invalid shard {shard_index} of {shard_count}: "
+            f"need SHARD_COUNT >= 1 and 0 <= SHARD_INDEX < SHARD_COUNT"
+        )
+
+
+def shard_for_id(transaction_id: str, shard_count: int) -> int:
+    """Return the index of the shard that owns a transaction ID"""
+    return int(transaction_id) % shard_count
+
+
+def random_id_in_shard(shard_index: int, shard_count: int) -> str:
+    """Generate a random 8-digit transaction ID owned by the given shard"""
+    check_shard(shard_index, shard_count)
+    n = random.randint(MIN_TRANSACTION_ID, MAX_TRANSACTION_ID)
+    n -= (n - shard_index) % shard_count
+    if n < MIN_TRANSACTION_ID:
+        n += shard_count
+    return str(n)
@@ -0,0 +1,183 @@
+"""
+Transaction Store Benchmark - Throughput checks for every backend
+Run this to compare storage backends before choosing one for production;
+the correctness checks live in test_transaction_store.py
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List
+
+from archive import ColdArchive, TieredTransactionStore
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from hash_chain import CheckpointLog, HashChain
+from sequencer import TimestampSequencer
+from transaction_store import STORE_BACKENDS, TransactionStore, open_store
+
+
+def make_transaction(i: int) -> Dict:
+    """Build a synthetic transaction record shaped like the real log"""
+    return {
+        "transaction_id": str(10000000 + i),
+        "timestamp": f"2026-02-13T07:{(i // 60) % 60:02d}:{i % 60:02d}+00:00",
+        "timestamp_unix": 1770966000 + i,
+        "timestamp_ns": (1770966000 + i) * 1_000_000_000 + i,
+        "document_hash": hashlib.sha256(str(i % 997).encode()).hexdigest(),
+        "payment_amount": 0.01,
+        "payment_token": "USDC",
+        "payment_network": "base",
+        "payment_verified": True,
+        "metadata": {"n": i}
+    }
+
+
+def measure_archive(backend: str, workdir: str, count: int, lookups: int):
+    """Report the archive's compression ratio and hot versus cold lookup latency"""
+    store = TieredTransactionStore(
+        open_store(backend, os.path.join(workdir, "archive-bench")),
+        ColdArchive(os.path.join(workdir, "archive-bench.blocks"))
+    )
+    records = [make_transaction(i) for i in range(count)]
+    for i in range(0, count, 1000):
+        store.append_many(records[i:i + 1000])
+    hot_ids = [tx["transaction_id"] for tx in random.sample(records, min(lookups, count))]
+    _timed("hot get_by_id", len(hot_ids), lambda: [store.get_by_id(tid) for tid in hot_ids])
+
+    # Twenty segments, so the Bloom filters have segments to skip
+    _timed("migrate", count - 1, lambda: store.migrate(
+        records[-1]["timestamp_ns"] + 1, segment_records=max(1, count // 20)
+    ))
+    stats = store.archive.stats()
+    print(f"  {'compression':<22} {stats['raw_bytes']:>10} -> {stats['compressed_bytes']} bytes "
+          f"({stats['compression_ratio']}x)")
+
+    cold_ids = [tid for tid in hot_ids if tid != records[-1]["transaction_id"]]
+    cold_hashes = [tx["document_hash"] for tx in random.sample(records, min(lookups, count))]
+    _timed("cold get_by_id", len(cold_ids), lambda: [store.get_by_id(tid) for tid in cold_ids])
+    _timed("cold get_by_hash", len(cold_hashes), lambda: [store.get_by_hash(h) for h in cold_hashes])
+    missing_ids = [str(90000000 + i) for i in range(len(cold_ids))]
+    _timed("cold get_by_id (miss)", len(missing_ids), lambda: [store.get_by_id(tid) for tid in missing_ids])
+    _timed("cold scan", count, lambda: sum(1 for _ in store.scan()))
+    store.close()
+
+
+def _timed(label: str, ops: int, fn: Callable) -> Dict:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    rate = ops / elapsed if elapsed else float("inf")
+    print(f"  {label:<22} {ops:>8} ops  {elapsed:8.3f}s  {rate:12.0f} ops/s")
+    return {"label": label, "ops": ops, "seconds": elapsed}
+
+
+def measure_throughput(store: TransactionStore, count: int, batch_size: int, lookups: int) -> List[Dict]:
+    """Measure append, lookup, scan and aggregate rates"""
+    records = [make_transaction(i) for i in range(count)]
+    ids = [tx["transaction_id"] for tx in random.sample(records, min(lookups, count))]
+    hashes = [tx["document_hash"] for tx in random.sample(records, min(lookups, count))]
+
+    single = records[:min(count, 1000)]
+    rest = records[len(single):]
+
+    def append_single():
+        for tx in single:
+            store.append(tx)
+
+    def append_batched():
+        for i in range(0, len(rest), batch_size):
+            store.append_many(rest[i:i + batch_size])
+
+    def lookup_ids():
+        for transaction_id in ids:
+            store.get_by_id(transaction_id)
+
+    def lookup_hashes():
+        for document_hash in hashes:
+            store.get_by_hash(document_hash)
+
+    def batch_ids():
+        for _ in store.lookup_ids(ids):
+            pass
+
+    def full_scan():
+        for _ in store.scan():
+            pass
+
+    return [
+        _timed("append (single)", len(single), append_single),
+        _timed(f"append (batch={batch_size})", len(rest), append_batched),
+        _timed("get_by_id", len(ids), lookup_ids),
+        _timed("get_by_hash", len(hashes), lookup_hashes),
+        _timed("lookup_ids (batch)", len(ids), batch_ids),
+        _timed("scan", count, full_scan),
+        _timed("aggregate", 1, store.aggregate),
+    ]
+
+
+def measure_chain(backend: str, workdir: str, count: int, threads: int = 16):
+    """Measure chained appends from one thread and from many (group commit)"""
+    records = [make_transaction(i) for i in range(count)]
+    for label, workers in (("chain (1 thread)", 1), (f"chain ({threads} threads)", threads)):
+        name = f"chain-{workers}"
+        store = open_store(backend, os.path.join(workdir, name))
+        chain = HashChain(store, CheckpointLog(os.path.join(workdir, name + ".checkpoints"), Ed25519PrivateKey.generate()))
+        share = records[:min(count, 2000) // workers * workers]
+
+        def append_all():
+            def worker(part):
+                for tx in part:
+                    chain.append(dict(tx))
+            pool = [threading.Thread(target=worker, args=(share[i::workers],)) for i in range(workers)]
+            for thread in pool:
+                thread.start()
+            for thread in pool:
+                thread.join()
+
+        _timed(label, len(share), append_all)
+        store.close()
+
+
+def measure_sequencer(count: int):
+    """Measure the per-call cost of issuing a timestamp"""
+    sequencer = TimestampSequencer()
+    issued = []
+
+    def issue():
+        for _ in range(count):
+            issued.append(sequencer.next_ns())
+
+    print("[sequencer]")
+    _timed("next_ns", count, issue)
+    assert all(a < b for a, b in zip(issued, issued[1:]))
+    print("  strictly increasing    OK")
+    print()
+
+
+def run(backends: List[str], count: int, batch_size: int, lookups: int):
+    measure_sequencer(count)
+    for backend in backends:
+        print(f"[{backend}]")
+        with tempfile.TemporaryDirectory() as workdir:
+            store = open_store(backend, os.path.join(workdir, "throughput"))
+            measure_throughput(store, count, batch_size, lookups)
+            store.close()
+
+            measure_chain(backend, workdir, count)
+            measure_archive(backend, workdir, count, lookups)
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark transaction store backends")
+    parser.add_argument("--backend", action="append", choices=sorted(STORE_BACKENDS),
+                        help="Backend to test (repeatable, default: all)")
+    parser.add_argument("--count", type=int, default=50000, help="Records to append")
+    parser.add_argument("--batch-size", type=int, default=500, help="Records per batched append")
+    parser.add_argument("--lookups", type=int, default=200, help="Point lookups per index")
+    args = parser.parse_args()
+    run(args.backend or sorted(STORE_BACKENDS), args.count, args.batch_size, args.lookups)
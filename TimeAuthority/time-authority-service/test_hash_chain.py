@@ -0,0 +1,309 @@
+"""
+Hash Chain Tests - Linking, group commit, checkpoints and tamper detection
+Run with: python -m pytest
+"""
+
+import json
+import sqlite3
+import threading
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+from hash_chain import GENESIS_HASH, CheckpointLog, HashChain, audit, record_hash
+from store_benchmark import make_transaction
+from transaction_store import STORE_BACKENDS, open_store
+
+
+@pytest.fixture(params=sorted(STORE_BACKENDS))
+def backend(request):
+    return request.param
+
+
+class Log:
+    """A chained log on disk, reopened for every audit like the CLI does"""
+
+    def __init__(self, tmp_path, backend, interval=50):
+        self.backend = backend
+        self.path = str(tmp_path / "log")
+        self.state_path = str(tmp_path / "audit_state.json")
+        self.key = Ed25519PrivateKey.generate()
+        self.checkpoints = CheckpointLog(str(tmp_path / "checkpoints.jsonl"), self.key)
+        self.store = open_store(backend, self.path)
+        self.chain = HashChain(self.store, self.checkpoints, interval=interval)
+
+    def append(self, start, count, **fields):
+        for i in range(start, start + count):
+            self.chain.append(dict(make_transaction(i), **fields))
+
+    def audit(self, incremental=False):
+        store = open_store(self.backend, self.path)
+        verifier = CheckpointLog(self.checkpoints.path, public_key=self.key.public_key())
+        try:
+            return audit(store, verifier, state_path=self.state_path if incremental else None)
+        finally:
+            store.close()
+
+    def rewrite(self, index, change):
+        """Apply change() to the stored form of the index-th record, bypassing the store"""
+        if self.backend == "jsonl":
+            with open(self.path, 'r') as f:
+                lines = f.readlines()
+            lines[index] = change(lines[index].rstrip("\n")) + "\n"
+            with open(self.path, 'w') as f:
+                f.writelines(lines)
+        else:
+            conn = sqlite3.connect(self.path)
+            seq, record = conn.execute(
+                "SELECT seq, record FROM transactions ORDER BY seq LIMIT 1 OFFSET ?", (index,)
+            ).fetchone()
+            conn.execute("UPDATE transactions SET record = ? WHERE seq = ?", (change(record), seq))
+            conn.commit()
+            conn.close()
+
+    def edit(self, index, **fields):
+        self.rewrite(index, lambda raw: json.dumps(dict(json.loads(raw), **fields)))
+
+    def keep_first(self, count):
+        if self.backend == "jsonl":
+            with open(self.path, 'r') as f:
+                lines = f.readlines()[:count]
+            with open(self.path, 'w') as f:
+                f.writelines(lines)
+        else:
+            conn = sqlite3.connect(self.path)
+            conn.execute(
+                "DELETE FROM transactions WHERE seq > (SELECT seq FROM transactions ORDER BY seq LIMIT 1 OFFSET ?)",
+                (count - 1,)
+            )
+            conn.commit()
+            conn.close()
+
+    def edit_update(self, index, **fields):
+        """Change the fields of the index-th update journal entry, bypassing the store"""
+        if self.backend == "jsonl":
+            with open(self.path + ".updates", 'r') as f:
+                lines = f.readlines()
+            entry = json.loads(lines[index])
+            entry["fields"].update(fields)
+            lines[index] = json.dumps(entry) + "\n"
+            with open(self.path + ".updates", 'w') as f:
+                f.writelines(lines)
+        else:
+            conn = sqlite3.connect(self.path)
+            seq, stored = conn.execute(
+                "SELECT seq, fields FROM updates ORDER BY seq LIMIT 1 OFFSET ?", (index,)
+            ).fetchone()
+            stored = json.dumps(dict(json.loads(stored), **fields))
+            conn.execute("UPDATE updates SET fields = ? WHERE seq = ?", (stored, seq))
+            conn.commit()
+            conn.close()
+
+
+def test_concurrent_appends_form_one_chain(tmp_path):
+    log = Log(tmp_path, "jsonl", interval=100)
+    records = [make_transaction(i) for i in range(800)]
+
+    def worker(part):
+        for tx in part:
+            log.chain.append(tx)
+
+    threads = [threading.Thread(target=worker, args=(records[i::8],)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    head_hash = GENESIS_HASH
+    for _, tx in log.store.tail():
+        assert tx["prev_hash"] == head_hash
+        head_hash = record_hash(tx)
+    assert log.chain.head_hash == head_hash
+    assert log.chain.sequence == 800
+    assert [cp["sequence"] for cp in log.checkpoints.read()] == list(range(100, 801, 100))
+    assert log.audit()["ok"]
+
+
+def test_failed_write_leaves_head_unchanged(tmp_path):
+    log = Log(tmp_path, "jsonl")
+    log.append(0, 1)
+    head_hash = log.chain.head_hash
+
+    def broken(transactions):
+        raise OSError("disk full")
+
+    log.store.append_many = broken
+    with pytest.raises(OSError):
+        log.chain.commit(log.chain.enqueue(make_transaction(1)))
+    assert log.chain.head_hash == head_hash
+    assert log.chain.sequence == 1
+
+
+def test_clean_log_audits_and_resumes(tmp_path, backend):
+    log = Log(tmp_path, backend)
+    log.append(0, 250)
+    report = log.audit(incremental=True)
+    assert report["ok"]
+    assert (report["records_checked"], report["checkpoints_verified"]) == (250, 5)
+
+    log.append(250, 100)
+    report = log.audit(incremental=True)
+    assert report["ok"]
+    assert report["resumed_from_sequence"] == 250
+    assert (report["records_checked"], report["checkpoints_verified"]) == (100, 2)
+
+
+def test_edited_record_is_detected(tmp_path, backend):
+    log = Log(tmp_path, backend)
+    log.append(0, 250)
+    log.edit(100, document_hash="f" * 64)
+    report = log.audit()
+    assert not report["ok"]
+    assert report["broken"]["reason"] == "prev_hash mismatch"
+    assert report["broken"]["sequence"] == 102
+
+
+def test_flipped_payment_status_is_detected(tmp_path, backend):
+    log = Log(tmp_path, backend)
+    log.append(0, 250, payment_verified=False, payment_status="pending")
+    log.edit(100, payment_verified=True, payment_status="confirmed")
+    report = log.audit()
+    assert not report["ok"]
+    assert report["broken"]["sequence"] == 102
+
+
+def test_deleted_record_is_detected(tmp_path, backend):
+    log = Log(tmp_path, backend)
+    log.append(0, 250)
+    if backend == "jsonl":
+        log.rewrite(100, lambda raw: "")
+    else:
+        conn = sqlite3.connect(log.path)
+        conn.execute("DELETE FROM transactions WHERE seq = 101")
+        conn.commit()
+        conn.close()
+    report = log.audit()
+    assert not report["ok"]
+    assert report["broken"]["reason"] == "prev_hash mismatch"
+
+
+def test_unparseable_record_is_reported(tmp_path, backend):
+    log = Log(tmp_path, backend)
+    log.append(0, 250)
+    log.rewrite(100, lambda raw: raw[:40])
+    report = log.audit()
+    assert not report["ok"]
+    assert report["broken"]["reason"] == "unparseable record"
+    assert report["broken"]["sequence"] == 101
+
+
+def test_truncated_log_fails_on_resume(tmp_path, backend):
+    log = Log(tmp_path, backend)
+    log.append(0, 250)
+    assert log.audit(incremental=True)["ok"]
+    log.keep_first(2)
+    report = log.audit(incremental=True)
+    assert not report["ok"]
+    assert report["broken"]["reason"] == "records missing before last verified checkpoint"
+
+
+def test_rewritten_resume_point_fails(tmp_path, backend):
+    log = Log(tmp_path, backend)
+    log.append(0, 250)
+    assert log.audit(incremental=True)["ok"]
+    # The last verified record: on JSONL the edit also moves its end position
+    log.edit(249, document_hash="f" * 64)
+    log.append(250, 10)
+    report = log.audit(incremental=True)
+    assert not report["ok"]
+    assert report["broken"]["reason"] in ("last verified record changed", "last verified record missing")
+
+
+def test_shifted_offsets_fail_on_resume(tmp_path):
+    # A length-changing edit behind the saved JSONL offset leaves it mid-line
+    log = Log(tmp_path, "jsonl")
+    log.append(0, 250)
+    assert log.audit(incremental=True)["ok"]
+    log.edit(10, metadata={"n": 10, "note": "x" * 17})
+    log.append(250, 10)
+    report = log.audit(incremental=True)
+    assert not report["ok"]
+    assert report["broken"]["reason"] in ("unparseable record", "last verified record missing")
+
+
+def test_updates_are_chained(tmp_path, backend):
+    log = Log(tmp_path, backend)
+    log.append(0, 240, payment_verified=False, payment_status="pending")
+    assert log.chain.update("10000100", {"payment_verified": False, "payment_status": "failed"})
+    assert log.chain.update("10000101", {"payment_verified": True, "payment_status": "confirmed"})
+    assert not log.chain.update("99999999", {"payment_status": "confirmed"})
+    log.append(240, 10)
+    report = log.audit(incremental=True)
+    assert report["ok"]
+    assert (report["updates_checked"], report["checkpoints_verified"]) == (2, 5)
+
+    # Reopening the chain finds both heads, even though the newest
+    # record has been updated since it was appended
+    assert log.chain.update("10000249", {"payment_status": "failed"})
+    head_hash = log.chain.head_hash
+    log.store.close()
+    log.store = open_store(backend, log.path)
+    log.chain = HashChain(log.store, log.checkpoints, interval=50)
+    assert log.chain.head_hash == head_hash
+    assert log.chain.update_sequence == 3
+    log.append(250, 50)
+    assert log.audit(incremental=True)["ok"]
+
+
+def test_flipped_update_is_detected(tmp_path, backend):
+    log = Log(tmp_path, backend)
+    log.append(0, 200, payment_verified=False, payment_status="pending")
+    log.chain.update("10000100", {"payment_verified": False, "payment_status": "failed"})
+    log.append(200, 50)
+    # Flip failed to confirmed in the journal and in the record it updated
+    log.edit_update(0, payment_verified=True, payment_status="confirmed")
+    if backend == "sqlite":
+        log.edit(100, payment_verified=True, payment_status="confirmed")
+    report = log.audit()
+    assert not report["ok"]
+    assert report["broken"]["reason"] == "checkpoint update head mismatch"
+
+
+def test_record_disagreeing_with_journal_is_detected(tmp_path, backend):
+    log = Log(tmp_path, backend)
+    log.append(0, 200, payment_verified=False, payment_status="pending")
+    log.chain.update("10000100", {"payment_verified": False, "payment_status": "failed"})
+    log.append(200, 50)
+    # SQLite serves the record column, JSONL the journal overlay; either
+    # way the value read must be one the journal gave it
+    log.edit(100, payment_verified=True, payment_status="confirmed")
+    report = log.audit()
+    if backend == "sqlite":
+        assert not report["ok"]
+        assert report["broken"]["reason"] == "record disagrees with update journal"
+    else:
+        assert report["ok"]
+        assert open_store(backend, log.path).get_by_id("10000100")["payment_status"] == "failed"
+
+
+def test_checkpoint_from_another_key_is_rejected(tmp_path, backend):
+    log = Log(tmp_path, backend)
+    log.append(0, 40)
+    forged = CheckpointLog(log.checkpoints.path, Ed25519PrivateKey.generate())
+    forged.write(log.chain.sequence, log.chain.head_hash)
+    report = log.audit()
+    assert not report["ok"]
+    assert report["broken"]["reason"] == "checkpoint signature invalid"
+
+
+def test_values_the_codec_changes_audit_clean(tmp_path, backend):
+    # orjson reads wide integers back as floats and writes NaN as null;
+    # the chain must hash what the store returns, not what it was given
+    log = Log(tmp_path, backend)
+    log.append(0, 10)
+    log.chain.append(dict(make_transaction(10), metadata={"x": 123456789012345678901234567890}))
+    log.chain.append(dict(make_transaction(11), metadata={"x": float("nan"), "y": float("inf")}))
+    log.append(12, 38)
+    report = log.audit()
+    assert report["ok"], report
+    assert report["checkpoints_verified"] == 1
@@ -0,0 +1,44 @@
+"""
+Payment Pipeline Tests - Queued confirmations and orphaned pending stamps
+Run with: python -m pytest
+"""
+
+from payment_pipeline import (
+    PAYMENT_FAILED, PAYMENT_JOB_LOST, PaymentConfirmationPool, PaymentQueue, fail_orphaned_payments
+)
+from store_benchmark import make_transaction
+from transaction_store import open_store
+
+
+def pending(i):
+    return dict(make_transaction(i), payment_verified=False, payment_status="pending")
+
+
+def test_pending_stamps_without_jobs_are_failed(tmp_path):
+    store = open_store("jsonl", str(tmp_path / "log"))
+    store.append_many([pending(0), make_transaction(1), pending(2), pending(3)])
+    queue = PaymentQueue(str(tmp_path / "queue.db"))
+    queue.put("10000002", {"payment": "still queued"})
+    pool = PaymentConfirmationPool(store, queue, verify=lambda payment: {"verified": True})
+
+    assert pool.reconcile(store.scan()) == 2
+    statuses = {tx["transaction_id"]: (tx.get("payment_status"), tx.get("payment_error")) for tx in store.scan()}
+    assert statuses["10000000"] == (PAYMENT_FAILED, PAYMENT_JOB_LOST)
+    assert statuses["10000002"] == ("pending", None)
+    assert statuses["10000003"] == (PAYMENT_FAILED, PAYMENT_JOB_LOST)
+    # Confirmed stamps are left alone, and a second pass finds nothing
+    assert "payment_error" not in store.get_by_id("10000001")
+    assert fail_orphaned_payments(store, store.scan(), queue.transaction_ids()) == 0
+    queue.close()
+    store.close()
+
+
+def test_unrecorded_outcome_keeps_the_job(tmp_path):
+    store = open_store("jsonl", str(tmp_path / "log"))
+    queue = PaymentQueue(str(tmp_path / "queue.db"))
+    queue.put("99999999", {"payment": "for a missing record"})
+    pool = PaymentConfirmationPool(store, queue, verify=lambda payment: {"verified": True})
+    pool._process(*queue.claim(timeout=0))
+    assert len(queue) == 1
+    queue.close()
+    store.close()
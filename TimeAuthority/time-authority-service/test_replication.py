@@ -0,0 +1,146 @@
+"""
+Replication Tests - Stream rounds, follower error handling, lag and access
+Run with: python -m pytest
+"""
+
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import codec
+from replication import (
+    HEARTBEAT_INTERVAL, ReplicationFollower, _read_round, add_replication_routes, replication_stream
+)
+from store_benchmark import make_transaction
+from transaction_store import open_store
+
+
+def collect(stream):
+    async def run():
+        return [line async for chunk in stream for line in chunk.splitlines()]
+    return [codec.loads(line) for line in asyncio.run(run())]
+
+
+def test_updates_wait_until_records_are_sent(tmp_path):
+    store = open_store("jsonl", str(tmp_path / "log"))
+    store.append_many([dict(make_transaction(i), payment_status="pending") for i in range(25)])
+    store.update("10000020", {"payment_status": "confirmed"})
+
+    lines, record_position, update_position, caught_up = _read_round(store, 0, 0, 10)
+    assert (len(lines), update_position, caught_up) == (10, 0, False)
+    # Rounds that hit the limit carry no heartbeat and go out back to back
+    messages = collect(replication_stream(store, poll_interval=0.05, max_seconds=0.5, batch=10))
+    assert [m["type"] for m in messages[:27]] == ["record"] * 25 + ["update", "heartbeat"]
+    assert messages[26]["update_position"] == messages[25]["position"]
+    assert {m["type"] for m in messages[27:]} <= {"heartbeat"}
+
+
+def test_follower_survives_apply_errors(tmp_path):
+    store = open_store("jsonl", str(tmp_path / "log"))
+    follower = ReplicationFollower(store, "http://primary", str(tmp_path / "state.json"), retry_delay=0.01)
+    calls = []
+
+    def broken(client):
+        calls.append(client)
+        follower.connected = True
+        raise OSError("disk full")
+
+    follower._follow = broken
+    follower.start()
+    deadline = time.monotonic() + 5
+    while len(calls) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert follower._thread.is_alive()
+    assert not follower.connected
+    assert follower.status()["last_error"] == "OSError: disk full"
+    follower.stop()
+    assert not follower._thread.is_alive()
+
+
+def test_lag_grows_without_heartbeats(tmp_path):
+    store = open_store("jsonl", str(tmp_path / "log"))
+    follower = ReplicationFollower(store, "http://primary", str(tmp_path / "state.json"))
+    follower.connected = True
+    follower.primary_time_ns = follower.applied_at_ns = time.time_ns()
+    assert follower.lag_seconds() < 0.5
+    stale = int((HEARTBEAT_INTERVAL + 5) * 1e9)
+    follower.primary_time_ns -= stale
+    follower.applied_at_ns -= stale
+    assert follower.lag_seconds() >= 5
+
+
+def test_stream_requires_token(tmp_path):
+    store = open_store("jsonl", str(tmp_path / "log"))
+    disabled, enabled = FastAPI(), FastAPI()
+    add_replication_routes(disabled, store, None)
+    add_replication_routes(enabled, store, "secret")
+    assert TestClient(disabled).get("/replication/stream").status_code == 403
+    client = TestClient(enabled)
+    assert client.get("/replication/stream").status_code == 401
+    assert client.get("/replication/stream", headers={"X-Replication-Token": "wrong"}).status_code == 401
+
+
+def crash_after_apply(follower):
+    """Make the save that follows an apply fail, as if the process died there"""
+    save_state = follower._save_state
+
+    def save(applying=None):
+        if applying is None:
+            raise OSError("killed")
+        save_state(applying)
+
+    follower._save_state = save
+
+
+def test_records_are_applied_in_primary_order(tmp_path):
+    store = open_store("jsonl", str(tmp_path / "log"))
+    store.append_many([make_transaction(100)])
+    follower = ReplicationFollower(store, "http://primary", str(tmp_path / "state.json"))
+    # Older timestamps than the newest local record are not replays
+    follower._flush([make_transaction(1), make_transaction(2)], 500)
+    assert [tx["transaction_id"] for _, tx in store.tail()] == ["10000100", "10000001", "10000002"]
+    assert follower.record_position == 500
+
+
+def test_batch_applied_before_a_crash_is_not_replayed(tmp_path):
+    store = open_store("jsonl", str(tmp_path / "log"))
+    state_path = str(tmp_path / "state.json")
+    follower = ReplicationFollower(store, "http://primary", state_path)
+    follower._flush([make_transaction(0)], 100)
+    crash_after_apply(follower)
+    with pytest.raises(OSError):
+        follower._flush([make_transaction(1), make_transaction(2)], 300)
+    assert ReplicationFollower(store, "http://primary", state_path).record_position == 300
+
+    # A batch that never reached the store is fetched again
+    def broken(transactions):
+        raise OSError("disk full")
+
+    follower = ReplicationFollower(store, "http://primary", state_path)
+    follower.store.append_many = broken
+    with pytest.raises(OSError):
+        follower._flush([make_transaction(3)], 400)
+    del store.append_many
+    assert ReplicationFollower(store, "http://primary", state_path).record_position == 300
+
+
+def test_update_applied_before_a_crash_is_not_replayed(tmp_path, caplog):
+    store = open_store("jsonl", str(tmp_path / "log"))
+    store.append_many([make_transaction(0)])
+    state_path = str(tmp_path / "state.json")
+    follower = ReplicationFollower(store, "http://primary", state_path)
+    message = {"type": "update", "position": 70, "transaction_id": "10000000",
+               "fields": {"payment_status": "failed"}, "prev_hash": "a" * 64}
+    crash_after_apply(follower)
+    with pytest.raises(OSError):
+        follower._apply_update(message)
+    follower = ReplicationFollower(store, "http://primary", state_path)
+    assert follower.update_position == 70
+    assert len(list(store.tail_updates())) == 1
+
+    follower._apply_update(dict(message, position=90, transaction_id="99999999"))
+    assert follower.update_position == 90
+    assert "99999999 matched no local record" in caplog.text
@@ -0,0 +1,118 @@
+"""
+Sharding Tests - ID partitioning and the router, against mocked shard nodes
+Run with: python -m pytest
+"""
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import shard_router
+from sharding import MAX_TRANSACTION_ID, MIN_TRANSACTION_ID, check_shard, random_id_in_shard, shard_for_id
+
+
+def test_ids_round_trip_to_their_shard():
+    for shard_count in range(1, 9):
+        for shard_index in range(shard_count):
+            for _ in range(200):
+                transaction_id = random_id_in_shard(shard_index, shard_count)
+                assert len(transaction_id) == 8
+                assert MIN_TRANSACTION_ID <= int(transaction_id) <= MAX_TRANSACTION_ID
+                assert shard_for_id(transaction_id, shard_count) == shard_index
+
+
+@pytest.mark.parametrize("shard_index, shard_count", [(4, 4), (-1, 4), (0, 0)])
+def test_shards_outside_the_range_are_rejected(shard_index, shard_count):
+    with pytest.raises(ValueError):
+        check_shard(shard_index, shard_count)
+    with pytest.raises(ValueError):
+        random_id_in_shard(shard_index, shard_count)
+
+
+class MockShards:
+    """Shard nodes answering over httpx.MockTransport, each with its own records"""
+
+    def __init__(self, count: int):
+        self.urls = [f"http://shard{i}" for i in range(count)]
+        self.records = [{} for _ in range(count)]
+        self.stamped = []
+        self.down = set()
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        shard = self.urls.index(f"http://{request.url.host}")
+        if shard in self.down:
+            raise httpx.ConnectError("connection refused", request=request)
+        records = self.records[shard]
+        path = request.url.path
+        if path == "/timestamp":
+            transaction_id = random_id_in_shard(shard, len(self.urls))
+            records[transaction_id] = {
+                "transaction_id": transaction_id,
+                "document_hash": "a" * 64,
+                "timestamp_ns": len(self.stamped),
+                "payment_amount": 0.01
+            }
+            self.stamped.append((shard, request.headers.get("x-payment")))
+            return httpx.Response(200, json=records[transaction_id], headers={"X-Payment-Response": "{}"})
+        if path.startswith("/verify/hash/"):
+            matches = [tx for tx in records.values() if tx["document_hash"] == path.rsplit("/", 1)[1]]
+            if not matches:
+                return httpx.Response(404, json={"detail": "Document hash not found"})
+            return httpx.Response(200, json={"verified": True, "transactions": matches})
+        if path.startswith("/verify/"):
+            transaction = records.get(path.rsplit("/", 1)[1])
+            if not transaction:
+                return httpx.Response(404, json={"detail": "Transaction ID not found"})
+            return httpx.Response(200, json={"verified": True, "transaction": transaction})
+        if path == "/stats":
+            return httpx.Response(200, json={
+                "total_timestamps": len(records),
+                "total_revenue_usdc": round(sum(tx["payment_amount"] for tx in records.values()), 6),
+                "price_per_timestamp": 0.01,
+                "payment_token": "USDC"
+            })
+        return httpx.Response(404)
+
+
+@pytest.fixture
+def shards(monkeypatch):
+    mock = MockShards(3)
+    monkeypatch.setattr(shard_router, "SHARD_URLS", mock.urls)
+    monkeypatch.setattr(shard_router, "client", httpx.AsyncClient(transport=httpx.MockTransport(mock.handle)))
+    return mock
+
+
+def test_router_spreads_stamps_and_routes_lookups(shards):
+    with TestClient(shard_router.app) as client:
+        issued = []
+        for _ in range(6):
+            response = client.post("/timestamp", json={"hash": "a" * 64}, headers={"X-Payment": "paid"})
+            assert response.status_code == 200
+            assert response.headers["x-payment-response"] == "{}"
+            issued.append(response.json()["transaction_id"])
+        assert sorted(shard for shard, _ in shards.stamped) == [0, 0, 1, 1, 2, 2]
+        assert {payment for _, payment in shards.stamped} == {"paid"}
+
+        for transaction_id in issued:
+            response = client.get(f"/verify/{transaction_id}")
+            assert response.status_code == 200
+            assert response.json()["transaction"]["transaction_id"] == transaction_id
+        assert client.get("/verify/not-a-number").status_code == 404
+
+        merged = client.get("/verify/hash/" + "a" * 64).json()["transactions"]
+        assert [tx["transaction_id"] for tx in merged] == issued
+        assert client.get("/verify/hash/" + "b" * 64).status_code == 404
+
+        stats = client.get("/stats").json()
+        assert stats["total_timestamps"] == 6
+        assert stats["total_revenue_usdc"] == 0.06
+        assert len(stats["shards"]) == 3
+
+
+def test_router_reports_unavailable_shards(shards):
+    shards.down.add(1)
+    with TestClient(shard_router.app) as client:
+        assert client.get("/stats").status_code == 503
+        assert client.get("/verify/hash/" + "a" * 64).status_code == 503
+        assert client.get("/verify/" + random_id_in_shard(1, 3)).status_code == 503
+        assert client.get("/verify/" + random_id_in_shard(0, 3)).status_code == 404
@@ -0,0 +1,296 @@
+"""
+Transaction Store Tests - The TransactionStore contract, checked on every backend
+Run with: python -m pytest
+"""
+
+import os
+import time
+
+import pytest
+
+from archive import ArchiveMigrator, ColdArchive, TieredTransactionStore
+from store_benchmark import make_transaction
+from transaction_store import STORE_BACKENDS, TransactionStore, open_store
+
+
+@pytest.fixture(params=sorted(STORE_BACKENDS))
+def backend(request):
+    return request.param
+
+
+def check_conformance(store: TransactionStore):
+    """Exercise the TransactionStore contract on an empty store"""
+    assert store.get_by_id("10000000") is None
+    assert store.max_timestamp_ns() == 0
+    assert store.last() is None
+    assert list(store.tail()) == []
+    assert list(store.tail_updates()) == []
+    assert store.aggregate()["count"] == 0
+    assert list(store.scan()) == []
+
+    records = [make_transaction(i) for i in range(2000)]
+    store.append(records[0])
+    store.append_many(records[1:])
+
+    assert store.get_by_id("10000000") == records[0]
+    assert store.get_by_id("10001999") == records[1999]
+    assert store.get_by_id("99999999") is None
+
+    same_hash = [tx for tx in records if tx["document_hash"] == records[5]["document_hash"]]
+    assert store.get_by_hash(records[5]["document_hash"]) == same_hash
+    assert store.get_by_hash("0" * 64) == []
+
+    found = dict(store.lookup_ids(["10000007", "10000003", "99999999", "10000003"]))
+    assert found == {"10000003": records[3], "10000007": records[7]}
+    found = sorted(
+        (tx["transaction_id"], h) for h, tx in store.lookup_hashes([records[5]["document_hash"], "0" * 64])
+    )
+    assert found == sorted((tx["transaction_id"], tx["document_hash"]) for tx in same_hash)
+    found = sorted(
+        (kind, key, tx["transaction_id"])
+        for kind, key, tx in store.lookup(["10000007", "99999999"], [records[5]["document_hash"], "0" * 64])
+    )
+    assert found == sorted(
+        [("transaction_id", "10000007", "10000007")]
+        + [("document_hash", tx["document_hash"], tx["transaction_id"]) for tx in same_hash]
+    )
+
+    assert list(store.scan()) == records
+    window = list(store.scan(start_unix=1770966100, end_unix=1770966200))
+    assert window == records[100:200]
+    window = list(store.scan(start_id="10000500", end_id="10000600"))
+    assert window == records[500:600]
+    window = list(store.scan(start_unix=1770966100, end_id="10000150"))
+    assert window == records[100:150]
+    window = list(store.scan(start_ns=records[300]["timestamp_ns"], end_ns=records[310]["timestamp_ns"]))
+    assert window == records[300:310]
+    assert store.max_timestamp_ns() == records[-1]["timestamp_ns"]
+    assert store.last() == records[-1]
+
+    positions = [position for position, _ in store.tail()]
+    assert [tx for _, tx in store.tail()] == records
+    assert positions == sorted(set(positions))
+    assert [tx for _, tx in store.tail(positions[1499])] == records[1500:]
+    assert list(store.tail(positions[-1])) == []
+    assert list(store.scan(after_position=positions[1499])) == records[1500:]
+    assert list(store.scan(start_id="10001700", after_position=positions[1499])) == records[1700:]
+    assert store.aggregate(after_position=positions[1499])["count"] == 500
+
+    entry = store.update("10000010", {"payment_verified": False, "payment_status": "pending"}, prev_hash="a" * 64)
+    assert entry == {
+        "transaction_id": "10000010",
+        "fields": {"payment_verified": False, "payment_status": "pending"},
+        "previous": {"payment_verified": True},
+        "prev_hash": "a" * 64
+    }
+    assert store.update("10000010", {"payment_verified": True, "payment_status": "confirmed"})
+    assert store.update("99999999", {"payment_status": "confirmed"}) is None
+    updates = list(store.tail_updates())
+    assert updates[0][1] == entry
+    assert [(u["transaction_id"], u["fields"]["payment_status"], u["previous"]) for _, u in updates] == [
+        ("10000010", "pending", {"payment_verified": True}),
+        ("10000010", "confirmed", {"payment_verified": False, "payment_status": "pending"})
+    ]
+    assert [u["transaction_id"] for _, u in store.tail_updates(updates[0][0])] == ["10000010"]
+    updated = dict(records[10], payment_verified=True, payment_status="confirmed")
+    assert store.get_by_id("10000010") == updated
+    assert list(store.scan(start_id="10000010", end_id="10000011")) == [updated]
+
+    totals = store.aggregate()
+    assert totals["count"] == len(records)
+    assert abs(totals["total_revenue"] - 0.01 * len(records)) < 1e-6
+
+
+def check_drop_before(store: TransactionStore):
+    """Dropping a prefix keeps the remaining records and their positions"""
+    records = [make_transaction(i) for i in range(300)]
+    store.append_many(records)
+    positions = [position for position, _ in store.tail()]
+    assert store.update(records[50]["transaction_id"], {"payment_status": "confirmed"})
+    assert store.update(records[150]["transaction_id"], {"payment_status": "confirmed"})
+    records[150] = dict(records[150], payment_status="confirmed")
+    store.drop_before(positions[99])
+    assert not store.update(records[50]["transaction_id"], {"payment_status": "failed"})
+    assert [tx for _, tx in store.tail()] == records[100:]
+    assert [position for position, _ in store.tail()] == positions[100:]
+    assert [tx for _, tx in store.tail(positions[199])] == records[200:]
+    assert store.get_by_id(records[0]["transaction_id"]) is None
+    assert store.aggregate()["count"] == 200
+    extra = make_transaction(300)
+    store.append(extra)
+    assert [tx for _, tx in store.tail(positions[-1])] == [extra]
+
+
+def check_archive(backend: str, workdir: str):
+    """Moving records into the cold archive changes nothing callers can see"""
+    path = os.path.join(workdir, "tiered")
+    archive_path = os.path.join(workdir, "archive.blocks")
+    store = TieredTransactionStore(open_store(backend, path), ColdArchive(archive_path))
+    check_conformance(store)
+
+    records = [tx for _, tx in store.tail()]
+    tail = list(store.tail())
+    window = list(store.scan(start_unix=1770966100, end_unix=1770966200))
+    hashes = sorted((tx["transaction_id"], h) for h, tx in store.lookup_hashes([records[5]["document_hash"]]))
+    totals = store.aggregate()
+
+    assert store.migrate(records[1500]["timestamp_ns"], max_records=1000) == 1000
+    assert store.migrate(records[1500]["timestamp_ns"]) == 500
+    assert store.migrate(records[1500]["timestamp_ns"]) == 0
+    assert store.archive.stats()["records"] == 1500
+    assert store.hot.aggregate()["count"] == 500
+
+    def check_unchanged():
+        assert list(store.tail()) == tail
+        assert [tx for _, tx in store.tail(tail[1199][0])] == records[1200:]
+        assert list(store.scan()) == records
+        assert list(store.scan(start_unix=1770966100, end_unix=1770966200)) == window
+        assert list(store.scan(start_id="10001400", end_id="10001600")) == records[1400:1600]
+        assert store.get_by_id("10000003") == records[3]
+        assert store.get_by_id("10001999") == records[1999]
+        assert store.get_by_id("99999999") is None
+        assert store.get_by_hash(records[5]["document_hash"]) == [
+            tx for tx in records if tx["document_hash"] == records[5]["document_hash"]
+        ]
+        assert sorted((tx["transaction_id"], h) for h, tx in store.lookup_hashes([records[5]["document_hash"]])) == hashes
+        found = dict(store.lookup_ids(["10000007", "10001800", "99999999"]))
+        assert found == {"10000007": records[7], "10001800": records[1800]}
+        found = sorted(
+            (kind, key, tx["transaction_id"])
+            for kind, key, tx in store.lookup(["10000007", "10001800"], [records[5]["document_hash"]])
+        )
+        assert found == sorted(
+            [("transaction_id", "10000007", "10000007"), ("transaction_id", "10001800", "10001800")]
+            + [("document_hash", h, tid) for tid, h in hashes]
+        )
+        assert store.aggregate()["count"] == totals["count"]
+        assert abs(store.aggregate()["total_revenue"] - totals["total_revenue"]) < 1e-6
+        assert store.aggregate(after_position=tail[999][0])["count"] == 1000
+        assert store.last() == records[-1]
+
+    check_unchanged()
+    # Reopening reloads the seek tables (and the JSONL base offset)
+    store.close()
+    store = TieredTransactionStore(open_store(backend, path), ColdArchive(archive_path))
+    check_unchanged()
+
+    # A segment written without its hot records being dropped (a crash
+    # mid-migration) is completed on open
+    entries = list(store.hot.tail(store.archive.end_position(store.archive.segments)))[:100]
+    store.archive.write_segment(entries)
+    store.close()
+    store = TieredTransactionStore(open_store(backend, path), ColdArchive(archive_path))
+    check_unchanged()
+    assert store.hot.aggregate()["count"] == 400
+    store.close()
+
+
+def test_conformance(backend, tmp_path):
+    store = open_store(backend, str(tmp_path / "log"))
+    check_conformance(store)
+    store.close()
+
+
+def test_drop_before(backend, tmp_path):
+    store = open_store(backend, str(tmp_path / "log"))
+    check_drop_before(store)
+    records = [tx for _, tx in store.tail()]
+    store.close()
+    store = open_store(backend, str(tmp_path / "log"))
+    assert [tx for _, tx in store.tail()] == records
+    store.close()
+
+
+def test_update_finds_records_anywhere(backend, tmp_path):
+    store = open_store(backend, str(tmp_path / "log"))
+    records = [make_transaction(i) for i in range(5000)]
+    store.append_many(records)
+    # An in-flight append (no newline yet) must not hide earlier records
+    if backend == "jsonl":
+        with open(str(tmp_path / "log"), 'a') as f:
+            f.write('{"transaction_id": "99999999"')
+    for i in (0, 1, 2500, 4999):
+        assert store.update(records[i]["transaction_id"], {"payment_status": "failed"})
+        assert store.get_by_id(records[i]["transaction_id"])["payment_status"] == "failed"
+    assert not store.update("99999999", {"payment_status": "failed"})
+    store.close()
+
+
+def test_archive(backend, tmp_path):
+    check_archive(backend, str(tmp_path))
+
+
+def test_archive_lookups_skip_segments(backend, tmp_path):
+    store = TieredTransactionStore(open_store(backend, str(tmp_path / "log")), ColdArchive(str(tmp_path / "archive.blocks")))
+    records = [make_transaction(i) for i in range(2001)]
+    store.append_many(records)
+    drops = []
+    drop_before = store.hot.drop_before
+    store.hot.drop_before = lambda position: drops.append(position) or drop_before(position)
+    assert store.migrate(records[-1]["timestamp_ns"], segment_records=100) == 2000
+    assert store.archive.stats()["segments"] == 20
+    assert len(drops) == 1
+
+    inflated = []
+    read_block = store.archive._read_block
+    store.archive._read_block = lambda block: inflated.append(block) or read_block(block)
+    # Every segment's ID range covers these, but the filters rule most out
+    misses = [str(10000000 + i) + "5" for i in range(0, 2000, 40)]
+    assert all(store.get_by_id(tid) is None for tid in misses)
+    assert len(inflated) <= 5
+    inflated.clear()
+    assert store.get_by_id("10001234") == records[1234]
+    assert len(inflated) <= 2
+    inflated.clear()
+    assert store.get_by_hash("f" * 64) == []
+    assert len(inflated) <= 2
+    with pytest.raises(RuntimeError):
+        store.drop_before(1)
+    store.close()
+
+
+def test_pending_payments_stay_hot(backend, tmp_path):
+    store = TieredTransactionStore(open_store(backend, str(tmp_path / "log")), ColdArchive(str(tmp_path / "archive.blocks")))
+    records = [make_transaction(i) for i in range(300)]
+    records[100] = dict(records[100], payment_verified=False, payment_status="pending")
+    store.append_many(records)
+    assert store.migrate(records[-1]["timestamp_ns"]) == 100
+    assert store.held_by["transaction_id"] == "10000100"
+    assert store.update("10000100", {"payment_verified": True, "payment_status": "confirmed"})
+    assert store.migrate(records[-1]["timestamp_ns"]) == 199
+    assert store.held_by is None
+    assert store.get_by_id("10000100")["payment_status"] == "confirmed"
+    store.close()
+
+
+def test_migrator_survives_failed_runs(tmp_path):
+    store = TieredTransactionStore(open_store("jsonl", str(tmp_path / "log")), ColdArchive(str(tmp_path / "archive.blocks")))
+    store.append_many([make_transaction(i) for i in range(300)])
+    write_segment = store.archive.write_segment
+    segments = []
+
+    def fail_second(entries):
+        if segments:
+            raise OSError("disk full")
+        segments.append(write_segment(entries))
+
+    store.archive.write_segment = fail_second
+    migrator = ArchiveMigrator(store, max_age_seconds=0, interval=0.05, retry_delay=0.01)
+    # The segment written before the failure still leaves the hot store
+    with pytest.raises(OSError):
+        store.migrate(time.time_ns(), segment_records=100)
+    assert store.hot.aggregate()["count"] == 200
+
+    migrator.start()
+    deadline = time.monotonic() + 5
+    while migrator.last_error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert migrator.last_error["error"] == "OSError: disk full"
+    store.archive.write_segment = write_segment
+    while migrator.last_run is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    migrator.stop()
+    assert migrator._thread is not None and not migrator._thread.is_alive()
+    assert migrator.last_run["records_archived"] == 199
+    assert migrator.last_error is None
+    store.close()
@@ -5,13 +5,23 @@ A pay-per-use timestamp witness service for AI agents using the x402 protocol
 
 from fastapi import FastAPI, Request, Response, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from datetime import datetime, timezone
 import hashlib
 import random
-import json
 import os
+import threading
+import logging
 from typing import Optional
+import codec
+from transaction_store import open_store
+from archive import ArchiveMigrator, ColdArchive, TieredTransactionStore
+from payment_pipeline import PAYMENT_CONFIRMED, PAYMENT_PENDING, fail_orphaned_payments
+from sequencer import TimestampSequencer
+from hash_chain import CheckpointLog, HashChain, load_checkpoint_key
+from tracing import SamplingProfiler, TraceFile, Tracer, span
+from sharding import check_shard, random_id_in_shard
 
 app = FastAPI(
     title="Time Authority",
@@ -36,8 +46,112 @@ PAYMENT_TOKEN = "USDC"
 # Your Coinbase wallet address on Base network
 RECIPIENT_ADDRESS = "0x9A51D52CcbeB0C414d1C4A0feC6fe345A169C1a4"
 
-# Transaction log file
-TRANSACTION_LOG = "transaction_log.jsonl"
+# Sharded deployments: this node owns transaction IDs with
+# int(id) % SHARD_COUNT == SHARD_INDEX (see shard_router.py)
+SHARD_COUNT = int(os.environ.get("SHARD_COUNT", "1"))
+SHARD_INDEX = int(os.environ.get("SHARD_INDEX", "0"))
+# A node outside the shard range would issue IDs the router sends elsewhere
+check_shard(SHARD_INDEX, SHARD_COUNT)
+
+# Transaction log storage ("jsonl" or "sqlite")
+TRANSACTION_STORE = os.environ.get("TRANSACTION_STORE", "jsonl")
+TRANSACTION_LOG = os.environ.get(
+    "TRANSACTION_LOG",
+    "transactions.db" if TRANSACTION_STORE == "sqlite" else "transaction_log.jsonl"
+)
+store = open_store(TRANSACTION_STORE, TRANSACTION_LOG)
+
+# Cold archive: records older than ARCHIVE_AFTER_DAYS are moved from the
+# log into compressed blocks in TRANSACTION_ARCHIVE every ARCHIVE_INTERVAL
+# seconds; once an archive exists, reads always cover both tiers
+ARCHIVE_AFTER_DAYS = float(os.environ.get("ARCHIVE_AFTER_DAYS", "0"))
+ARCHIVE_INTERVAL = int(os.environ.get("ARCHIVE_INTERVAL", "3600"))
+TRANSACTION_ARCHIVE = os.environ.get("TRANSACTION_ARCHIVE", "transaction_archive.blocks")
+
+archive_migrator = None
+if ARCHIVE_AFTER_DAYS or os.path.exists(TRANSACTION_ARCHIVE + ".index"):
+    store = TieredTransactionStore(store, ColdArchive(TRANSACTION_ARCHIVE))
+if ARCHIVE_AFTER_DAYS:
+    archive_migrator = ArchiveMigrator(store, ARCHIVE_AFTER_DAYS * 86400, interval=ARCHIVE_INTERVAL)
+
+    @app.on_event("startup")
+    def start_archive_migrator():
+        archive_migrator.start()
+
+    @app.on_event("shutdown")
+    def stop_archive_migrator():
+        archive_migrator.stop()
+
+# Issues strictly increasing nanosecond timestamps; seeded from the store
+# so a restart after a wall-clock step cannot reorder new records
+sequencer = TimestampSequencer()
+sequencer.observe(store.max_timestamp_ns())
+
+# Every record carries its predecessor's hash; the chain head is signed
+# into the checkpoint log every CHECKPOINT_INTERVAL records
+CHECKPOINT_LOG = os.environ.get("CHECKPOINT_LOG", "checkpoints.jsonl")
+CHECKPOINT_KEY_FILE = os.environ.get("CHECKPOINT_KEY_FILE", "checkpoint.key")
+CHECKPOINT_INTERVAL = int(os.environ.get("CHECKPOINT_INTERVAL", "1000"))
+chain = HashChain(
+    store,
+    CheckpointLog(CHECKPOINT_LOG, load_checkpoint_key(CHECKPOINT_KEY_FILE)),
+    interval=CHECKPOINT_INTERVAL
+)
+
+# Follower mode: set REPLICATE_FROM to a primary's base URL to serve
+# read endpoints from a local replica of its log (see replication.py)
+REPLICATE_FROM = os.environ.get("REPLICATE_FROM")
+FOLLOWER_STATE = os.environ.get("FOLLOWER_STATE", "follower_state.json")
+follower = None
+
+# Payment confirmation mode:
+#   "sync"  - payment is treated as verified before the stamp is issued
+#   "async" - stamp is issued as pending; workers confirm in the background
+PAYMENT_CONFIRMATION = os.environ.get("PAYMENT_CONFIRMATION", "sync")
+PAYMENT_QUEUE = os.environ.get("PAYMENT_QUEUE", "payment_queue.db")
+PAYMENT_WORKERS = int(os.environ.get("PAYMENT_WORKERS", "4"))
+
+payment_pool = None
+if PAYMENT_CONFIRMATION == "async" and not REPLICATE_FROM:
+    from x402_integration import X402PaymentVerifier
+    from payment_pipeline import PaymentQueue, PaymentConfirmationPool
+    verifier = X402PaymentVerifier(coinbase_api_key=os.environ.get("COINBASE_API_KEY"))
+    payment_pool = PaymentConfirmationPool(
+        chain,
+        PaymentQueue(PAYMENT_QUEUE),
+        verifier.verify_payment,
+        workers=PAYMENT_WORKERS
+    )
+
+    @app.on_event("startup")
+    def start_payment_workers():
+        payment_pool.start()
+
+    @app.on_event("shutdown")
+    def stop_payment_workers():
+        payment_pool.stop()
+
+    if TRANSACTION_STORE == "jsonl" and not ARCHIVE_AFTER_DAYS:
+        # Every async stamp gets an update, which the JSONL store keeps in memory
+        logging.getLogger(__name__).warning(
+            "Async payment confirmation with the JSONL store holds every payment outcome "
+            "in memory (about 400 bytes per stamp); use TRANSACTION_STORE=sqlite"
+        )
+
+# Stamps an earlier run left pending with no queued job (a crash before
+# the job was queued, a lost PAYMENT_QUEUE, or sync mode now) would never
+# get an outcome and would hold up archiving; fail them in the background.
+# Only records older than startup are checked; archived ones are never pending
+if not REPLICATE_FROM:
+    @app.on_event("startup")
+    def reconcile_pending_payments():
+        hot = store.hot if isinstance(store, TieredTransactionStore) else store
+        records = hot.scan(end_ns=store.max_timestamp_ns() + 1)
+        if payment_pool:
+            target = lambda: payment_pool.reconcile(records)
+        else:
+            target = lambda: fail_orphaned_payments(chain, records, set())
+        threading.Thread(target=target, name="payment-reconcile", daemon=True).start()
 
 class DocumentRequest(BaseModel):
     """Document to be timestamped - can be hash or content"""
@@ -50,24 +164,42 @@ class TimestampResponse(BaseModel):
     transaction_id: str
     timestamp: str
     timestamp_unix: int
+    timestamp_ns: int
     document_hash: str
     witnessed_by: str
     payment_verified: bool
+    payment_status: str
     signature: str
 
 def generate_transaction_id() -> str:
-    """Generate random 8-digit transaction ID"""
+    """Generate random 8-digit transaction ID (within this node's shard)"""
+    if SHARD_COUNT > 1:
+        return random_id_in_shard(SHARD_INDEX, SHARD_COUNT)
     return str(random.randint(10000000, 99999999))
 
 def hash_document(content: str) -> str:
     """Generate SHA-256 hash of document content"""
     return hashlib.sha256(content.encode()).hexdigest()
 
-def log_transaction(transaction_data: dict):
-    """Log transaction to file for your records"""
-    with open(TRANSACTION_LOG, 'a') as f:
-        json.dump(transaction_data, f)
-        f.write('\n')
+async def log_transaction(transaction_data: dict, payment_data: Optional[dict] = None):
+    """
+    Log transaction to the store for your records, linked into the hash chain
+
+    The record is queued in timestamp order on the event loop; the write
+    happens on a worker thread, where requests that arrive while another
+    write is in progress are committed together in one store append.
+    With payment_data, the confirmation job is queued on that same thread
+    once the record is committed, keeping the queue's fsync off the loop.
+    """
+    ticket = chain.enqueue(transaction_data)
+
+    def commit():
+        chain.commit(ticket)
+        if payment_data is not None:
+            with span("queue_payment"):
+                payment_pool.submit(transaction_data["transaction_id"], payment_data)
+
+    await run_in_threadpool(commit)
 
 def create_x402_payment_response(request: Request) -> dict:
     """Create x402 payment required response"""
@@ -95,15 +227,31 @@ async def root():
         "price": f"{PRICE_USDC} {PAYMENT_TOKEN}",
         "network": PAYMENT_NETWORK,
         "endpoint": "/timestamp",
-        "protocol": "x402 v2.0"
+        "protocol": "x402 v2.0",
+        "shard": {"index": SHARD_INDEX, "count": SHARD_COUNT},
+        "role": "follower" if REPLICATE_FROM else "primary"
     }
 
-@app.post("/timestamp")
-async def create_timestamp(
-    document: DocumentRequest,
-    request: Request,
-    response: Response
-):
+def json_response(content: dict, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """Encode a response body with the codec, skipping FastAPI's serializer"""
+    return Response(
+        content=codec.dumps_bytes(content),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json"
+    )
+
+@app.post(
+    "/timestamp",
+    response_model=TimestampResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": DocumentRequest.model_json_schema()}}
+        }
+    }
+)
+async def create_timestamp(request: Request):
     """
     Create timestamp for a document
     
@@ -112,44 +260,63 @@ async def create_timestamp(
     2. Second call with payment header creates timestamp
     """
     
+    if REPLICATE_FROM:
+        raise HTTPException(status_code=403, detail=f"Read-only follower; send timestamps to {REPLICATE_FROM}")
+    
+    # Parse and validate the body in one pass (see codec.validate_json)
+    body = await request.body()
+    with span("parse"):
+        document = codec.validate_json(DocumentRequest, body)
+    
     # Check for payment header (x402 protocol)
     payment_header = request.headers.get("X-Payment")
     
     if not payment_header:
         # No payment provided - return 402 with payment instructions
-        response.status_code = 402
         payment_details = create_x402_payment_response(request)
-        response.headers["X-Payment-Required"] = json.dumps(payment_details)
-        return {
-            "error": "Payment Required",
-            "message": f"Please pay {PRICE_USDC} {PAYMENT_TOKEN} to timestamp this document",
-            "payment": payment_details
-        }
+        return json_response(
+            {
+                "error": "Payment Required",
+                "message": f"Please pay {PRICE_USDC} {PAYMENT_TOKEN} to timestamp this document",
+                "payment": payment_details
+            },
+            status_code=402,
+            headers={"X-Payment-Required": codec.dumps(payment_details)}
+        )
     
     # Payment header present - verify and process
     try:
-        payment_data = json.loads(payment_header)
+        with span("parse_payment"):
+            payment_data = codec.loads(payment_header)
     except:
         raise HTTPException(status_code=400, detail="Invalid payment header")
     
-    # In production, you would verify the payment with Coinbase's facilitator
-    # For now, we'll assume payment is valid if header is present
-    # TODO: Add actual payment verification via Coinbase API
-    
-    payment_verified = True  # Would be result of verification call
+    with span("verify_payment"):
+        if payment_pool:
+            # Issue the stamp now; the worker pool confirms the payment later
+            payment_verified = False
+            payment_status = PAYMENT_PENDING
+        else:
+            # In production, you would verify the payment with Coinbase's facilitator
+            # For now, we'll assume payment is valid if header is present
+            # TODO: Add actual payment verification via Coinbase API
+            payment_verified = True  # Would be result of verification call
+            payment_status = PAYMENT_CONFIRMED
     
     # Generate document hash
     if document.hash:
         doc_hash = document.hash
     elif document.content:
-        doc_hash = hash_document(document.content)
+        with span("hash"):
+            doc_hash = hash_document(document.content)
     else:
         raise HTTPException(status_code=400, detail="Must provide either 'content' or 'hash'")
     
-    # Generate timestamp
-    now = datetime.now(timezone.utc)
+    # Generate timestamp (strictly increasing, nanosecond resolution)
+    timestamp_ns = sequencer.next_ns()
+    timestamp_unix, remainder_ns = divmod(timestamp_ns, 1_000_000_000)
+    now = datetime.fromtimestamp(timestamp_unix, timezone.utc).replace(microsecond=remainder_ns // 1000)
     timestamp_iso = now.isoformat()
-    timestamp_unix = int(now.timestamp())
     
     # Generate transaction ID (8 random digits)
     transaction_id = generate_transaction_id()
@@ -162,82 +329,128 @@ async def create_timestamp(
         "transaction_id": transaction_id,
         "timestamp": timestamp_iso,
         "timestamp_unix": timestamp_unix,
+        "timestamp_ns": timestamp_ns,
         "document_hash": doc_hash,
         "payment_amount": PRICE_USDC,
         "payment_token": PAYMENT_TOKEN,
         "payment_network": PAYMENT_NETWORK,
         "payment_verified": payment_verified,
+        "payment_status": payment_status,
         "metadata": document.metadata or {}
     }
-    log_transaction(transaction_log)
-    
-    # Create response
-    timestamp_response = TimestampResponse(
-        transaction_id=transaction_id,
-        timestamp=timestamp_iso,
-        timestamp_unix=timestamp_unix,
-        document_hash=doc_hash,
-        witnessed_by="Time Authority",
-        payment_verified=payment_verified,
-        signature=signature
-    )
+    with span("store_append"):
+        await log_transaction(transaction_log, payment_data if payment_pool else None)
     
-    # Add payment confirmation header
-    response.headers["X-Payment-Response"] = json.dumps({
-        "status": "confirmed",
+    # Create response (fields match TimestampResponse)
+    timestamp_response = {
         "transaction_id": transaction_id,
-        "amount": PRICE_USDC,
-        "currency": PAYMENT_TOKEN
-    })
+        "timestamp": timestamp_iso,
+        "timestamp_unix": timestamp_unix,
+        "timestamp_ns": timestamp_ns,
+        "document_hash": doc_hash,
+        "witnessed_by": "Time Authority",
+        "payment_verified": payment_verified,
+        "payment_status": payment_status,
+        "signature": signature
+    }
     
-    return timestamp_response
+    with span("render"):
+        # Add payment confirmation header
+        payment_response = codec.dumps({
+            "status": payment_status,
+            "transaction_id": transaction_id,
+            "amount": PRICE_USDC,
+            "currency": PAYMENT_TOKEN
+        })
+        return json_response(timestamp_response, headers={"X-Payment-Response": payment_response})
+
+# Lookups and aggregates read the store, which can mean scanning the log
+# or inflating archive blocks; plain def handlers run them in the threadpool
+@app.get("/verify/hash/{document_hash}")
+def verify_document_hash(document_hash: str):
+    """
+    Verify a document by hash - returns every timestamp witnessing it (free endpoint)
+    """
+    with span("store_lookup"):
+        transactions = store.get_by_hash(document_hash)
+    if transactions:
+        return {
+            "verified": True,
+            "transactions": transactions
+        }
+    
+    raise HTTPException(status_code=404, detail="Document hash not found")
 
 @app.get("/verify/{transaction_id}")
-async def verify_timestamp(transaction_id: str):
+def verify_timestamp(transaction_id: str):
     """
     Verify a timestamp by transaction ID (free endpoint)
     """
-    # Read transaction log and find matching transaction
-    if not os.path.exists(TRANSACTION_LOG):
-        raise HTTPException(status_code=404, detail="No transactions found")
-    
-    with open(TRANSACTION_LOG, 'r') as f:
-        for line in f:
-            transaction = json.loads(line)
-            if transaction["transaction_id"] == transaction_id:
-                return {
-                    "verified": True,
-                    "transaction": transaction
-                }
+    with span("store_lookup"):
+        transaction = store.get_by_id(transaction_id)
+    if transaction:
+        return {
+            "verified": True,
+            "transaction": transaction
+        }
     
     raise HTTPException(status_code=404, detail="Transaction ID not found")
 
 @app.get("/stats")
-async def get_stats():
+def get_stats():
     """
     Get service statistics (free endpoint)
     """
-    if not os.path.exists(TRANSACTION_LOG):
-        return {
-            "total_timestamps": 0,
-            "total_revenue_usdc": 0
-        }
-    
-    count = 0
-    with open(TRANSACTION_LOG, 'r') as f:
-        for line in f:
-            count += 1
+    with span("store_aggregate"):
+        totals = store.aggregate()
     
-    return {
-        "total_timestamps": count,
-        "total_revenue_usdc": count * PRICE_USDC,
+    stats = {
+        "total_timestamps": totals["count"],
+        # Summed as floats; USDC has 6 decimal places
+        "total_revenue_usdc": round(totals["total_revenue"], 6),
         "price_per_timestamp": PRICE_USDC,
         "payment_token": PAYMENT_TOKEN
     }
+    if isinstance(store, TieredTransactionStore):
+        stats["archive"] = store.archive.stats()
+        stats["archive"]["last_migration"] = archive_migrator.last_run if archive_migrator else None
+        stats["archive"]["migration_error"] = archive_migrator.last_error if archive_migrator else None
+    if follower:
+        stats["replication"] = follower.status()
+    return stats
+
+# Opt-in request tracing: TRACE_SAMPLE_RATE of requests (0 to 1) are
+# written to TRACE_FILE; /admin/* controls require the ADMIN_TOKEN header
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.json")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", ".")
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+tracer = Tracer(TraceFile(TRACE_FILE), sample_rate=TRACE_SAMPLE_RATE)
+
+from tracing import add_tracing_routes
+add_tracing_routes(app, tracer, SamplingProfiler(PROFILE_DIR), ADMIN_TOKEN)
 
 # Import dashboard
 from dashboard import add_dashboard_routes
-add_dashboard_routes(app)
+add_dashboard_routes(app, store)
+
+# Import bulk export
+from export import add_export_routes
+add_export_routes(app, store)
+
+# Import batch verification
+from verify_batch import add_batch_verify_routes
+add_batch_verify_routes(app, store)
+
+# Import replication: a node feeds followers only when REPLICATION_TOKEN is
+# set, and followers send the same token; a follower also tails its primary
+# and reports X-Replication-Lag on every response
+from replication import ReplicationFollower, add_follower_routes, add_replication_routes
+REPLICATION_TOKEN = os.environ.get("REPLICATION_TOKEN")
+add_replication_routes(app, store, REPLICATION_TOKEN)
+if REPLICATE_FROM:
+    follower = ReplicationFollower(store, REPLICATE_FROM, FOLLOWER_STATE, REPLICATION_TOKEN)
+    add_follower_routes(app, follower)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,286 @@
+"""
+Request Tracing - Opt-in spans and a sampling profiler for latency debugging
+Spans are written in Chrome Trace Event format (open in Perfetto or
+chrome://tracing); profiles are collapsed stacks for flamegraph tools
+"""
+
+from fastapi import FastAPI, Header, HTTPException
+from typing import Dict, List, Optional
+import codec
+import collections
+import contextvars
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+
+# The trace collecting spans for the current request, if it was sampled
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """Spans recorded for one sampled request"""
+
+    def __init__(self, trace_id: int, name: str):
+        self.trace_id = trace_id
+        self.name = name
+        self.start_wall_ns = time.time_ns()
+        self.start_ns = time.perf_counter_ns()
+        self.spans: List[tuple] = []
+
+
+class _Span:
+    __slots__ = ("trace", "name", "args", "start_ns")
+
+    def __init__(self, trace: Trace, name: str, args: Dict):
+        self.trace = trace
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end_ns = time.perf_counter_ns()
+        self.trace.spans.append((self.name, self.start_ns, end_ns - self.start_ns, self.args))
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **args):
+    """
+    Time a stage of the current request
+
+    Usage: with span("hash"): ...
+    Costs one context variable lookup when the request is not sampled.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(trace, name, args)
+
+
+class TraceFile:
+    """
+    Rotating trace output in Chrome's JSON Array Format
+
+    Each file starts with "[" and holds one event per line; the closing
+    bracket is optional in that format, so files are loadable while open.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 10 * 1024 * 1024, backups: int = 5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _open(self):
+        self._file = open(self.path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(b"[\n")
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def write_events(self, events: List[Dict]):
+        data = b"".join(codec.dumps_bytes(event) + b",\n" for event in events)
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._file.write(data)
+            self._file.flush()
+            if self._file.tell() >= self.max_bytes:
+                self._rotate()
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+
+class Tracer:
+    """Decides which requests to trace and writes their spans"""
+
+    def __init__(self, trace_file: TraceFile, sample_rate: float = 0.0):
+        self.trace_file = trace_file
+        self.sample_rate = sample_rate
+        self._ids = itertools.count(1)
+        self._pid = os.getpid()
+
+    def sample(self) -> bool:
+        rate = self.sample_rate
+        return rate > 0 and (rate >= 1 or random.random() < rate)
+
+    def start(self, name: str) -> Trace:
+        return Trace(next(self._ids), name)
+
+    def finish(self, trace: Trace, status: Optional[int]):
+        """Write the request's root span and every stage span as complete events"""
+        duration_ns = time.perf_counter_ns() - trace.start_ns
+        base_us = trace.start_wall_ns / 1000
+        events = [{
+            "name": trace.name,
+            "cat": "request",
+            "ph": "X",
+            "ts": base_us,
+            "dur": duration_ns / 1000,
+            "pid": self._pid,
+            "tid": trace.trace_id,
+            "args": {"status": status}
+        }]
+        for name, start_ns, span_ns, args in trace.spans:
+            events.append({
+                "name": name,
+                "cat": "stage",
+                "ph": "X",
+                "ts": base_us + (start_ns - trace.start_ns) / 1000,
+                "dur": span_ns / 1000,
+                "pid": self._pid,
+                "tid": trace.trace_id,
+                "args": args
+            })
+        self.trace_file.write_events(events)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware that traces a sample of HTTP requests
+
+    Unsampled requests pass straight through to the app.
+    """
+
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.sample():
+            await self.app(scope, receive, send)
+            return
+
+        trace = self.tracer.start(f"{scope['method']} {scope['path']}")
+        status = None
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = _current_trace.set(trace)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_trace.reset(token)
+            self.tracer.finish(trace, status)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler sampling every thread's stack at a fixed interval
+
+    Output is in collapsed-stack format ("frame;frame;frame count" per
+    line), accepted by flamegraph.pl, speedscope and inferno.
+    """
+
+    def __init__(self, output_dir: str = ".", interval: float = 0.005):
+        self.output_dir = output_dir
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float) -> str:
+        """Profile for the given number of seconds in the background; returns the output path"""
+        with self._lock:
+            if self.running:
+                raise RuntimeError("Profiler already running")
+            path = os.path.join(self.output_dir, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+            self._thread = threading.Thread(
+                target=self._run, args=(seconds, path), name="sampling-profiler", daemon=True
+            )
+            self._thread.start()
+            return path
+
+    def _run(self, seconds: float, path: str):
+        counts = collections.Counter()
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                counts[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+        with open(path, 'w') as f:
+            for stack, count in counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def add_tracing_routes(app: FastAPI, tracer: Tracer, profiler: SamplingProfiler, admin_token: Optional[str]):
+    """Install the tracing middleware and the admin-only tracing controls"""
+
+    app.add_middleware(TracingMiddleware, tracer=tracer)
+
+    def require_admin(token: Optional[str]):
+        if not admin_token:
+            raise HTTPException(status_code=403, detail="Admin endpoints are disabled (set ADMIN_TOKEN)")
+        if not token or not hmac.compare_digest(token, admin_token):
+            raise HTTPException(status_code=401, detail="Invalid admin token")
+
+    @app.post("/admin/trace", include_in_schema=False)
+    async def set_trace_sampling(sample_rate: float, x_admin_token: Optional[str] = Header(None)):
+        """Change the fraction of requests traced (0 disables tracing)"""
+        require_admin(x_admin_token)
+        if not 0 <= sample_rate <= 1:
+            raise HTTPException(status_code=400, detail="sample_rate must be between 0 and 1")
+        tracer.sample_rate = sample_rate
+        return {"sample_rate": tracer.sample_rate, "trace_file": tracer.trace_file.path}
+
+    @app.post("/admin/profile", include_in_schema=False)
+    async def start_profile(seconds: float = 10, x_admin_token: Optional[str] = Header(None)):
+        """Run the sampling profiler for N seconds and write a collapsed-stack profile"""
+        require_admin(x_admin_token)
+        if not 0 < seconds <= 300:
+            raise HTTPException(status_code=400, detail="seconds must be between 0 and 300")
+        try:
+            path = profiler.start(seconds)
+        except RuntimeError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return {"profiling": True, "seconds": seconds, "output": path}
@@ -0,0 +1,772 @@
+"""
+Transaction Store - Pluggable storage for the Time Authority transaction log
+Every read and write of timestamp records goes through a TransactionStore
+"""
+
+import codec
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class TransactionStore:
+    """
+    Interface shared by all transaction storage backends
+
+    Records are plain dicts in the same shape written to the transaction log.
+    """
+
+    def append(self, transaction: Dict):
+        """Append a single transaction record"""
+        self.append_many([transaction])
+
+    def append_many(self, transactions: Iterable[Dict]):
+        """Append a batch of transaction records in one write"""
+        raise NotImplementedError
+
+    def update(self, transaction_id: str, fields: Dict, prev_hash: Optional[str] = None) -> Optional[Dict]:
+        """
+        Merge fields into an existing record (e.g. final payment status)
+
+        The change is written to the update journal as {"transaction_id",
+        "fields", "previous", "prev_hash"}, where previous holds the values
+        fields replaced and prev_hash links the entry into the journal's
+        hash chain (see hash_chain.py). Returns that entry, or None if no
+        record has this transaction ID.
+        """
+        raise NotImplementedError
+
+    def get_by_id(self, transaction_id: str) -> Optional[Dict]:
+        """Return the transaction with this ID, or None"""
+        raise NotImplementedError
+
+    def get_by_hash(self, document_hash: str) -> List[Dict]:
+        """Return every transaction that witnessed this document hash"""
+        raise NotImplementedError
+
+    def lookup_ids(self, transaction_ids: Iterable[str]) -> Iterator[Tuple[str, Dict]]:
+        """
+        Resolve many transaction IDs at once
+
+        Yields (transaction_id, record) for each ID that exists, as soon as
+        it is found. IDs that are not yielded do not exist.
+        """
+        for transaction_id in sorted(set(transaction_ids)):
+            transaction = self.get_by_id(transaction_id)
+            if transaction:
+                yield transaction_id, transaction
+
+    def lookup_hashes(self, document_hashes: Iterable[str]) -> Iterator[Tuple[str, Dict]]:
+        """
+        Resolve many document hashes at once
+
+        Yields (document_hash, record) for every record witnessing one of
+        the hashes. Hashes that are not yielded were never stamped.
+        """
+        for document_hash in sorted(set(document_hashes)):
+            for transaction in self.get_by_hash(document_hash):
+                yield document_hash, transaction
+
+    def lookup(
+        self,
+        transaction_ids: Iterable[str],
+        document_hashes: Iterable[str]
+    ) -> Iterator[Tuple[str, str, Dict]]:
+        """
+        Resolve transaction IDs and document hashes together
+
+        Yields ("transaction_id", id, record) and ("document_hash", hash,
+        record) as lookup_ids() and lookup_hashes() would, in whatever
+        order the store finds them.
+        """
+        for transaction_id, transaction in self.lookup_ids(transaction_ids):
+            yield "transaction_id", transaction_id, transaction
+        for document_hash, transaction in self.lookup_hashes(document_hashes):
+            yield "document_hash", document_hash, transaction
+
+    def scan(
+        self,
+        start_unix: Optional[int] = None,
+        end_unix: Optional[int] = None,
+        start_id: Optional[str] = None,
+        end_id: Optional[str] = None,
+        start_ns: Optional[int] = None,
+        end_ns: Optional[int] = None,
+        after_position: int = 0
+    ) -> Iterator[Dict]:
+        """
+        Iterate transactions in append order
+
+        Args:
+            start_unix: Only include records with timestamp_unix >= start_unix
+            end_unix: Only include records with timestamp_unix < end_unix
+            start_id: Only include records with transaction_id >= start_id
+            end_id: Only include records with transaction_id < end_id
+            start_ns: Only include records with timestamp_ns >= start_ns
+            end_ns: Only include records with timestamp_ns < end_ns
+            after_position: Only include records after this tail() position
+        """
+        raise NotImplementedError
+
+    def tail(self, position: int = 0) -> Iterator[Tuple[int, Dict]]:
+        """
+        Iterate (position, record) pairs for records appended after position
+
+        Positions are opaque, increasing integers (a byte offset or row
+        number). Pass the last position seen back in to resume from there.
+        """
+        raise NotImplementedError
+
+    def tail_updates(self, position: int = 0) -> Iterator[Tuple[int, Dict]]:
+        """
+        Iterate (position, entry) for update journal entries written after position
+
+        Positions work like tail(): opaque and increasing, pass the last
+        one seen back in to resume.
+        """
+        raise NotImplementedError
+
+    def drop_before(self, position: int):
+        """
+        Permanently remove every record at or before position (see tail())
+
+        Used once those records are kept elsewhere, e.g. the cold archive.
+        Positions of the remaining records do not change.
+        """
+        raise NotImplementedError
+
+    def last(self) -> Optional[Dict]:
+        """Return the most recently appended record, or None"""
+        raise NotImplementedError
+
+    def max_timestamp_ns(self) -> int:
+        """Return the newest timestamp_ns in the store (0 when empty)"""
+        transaction = self.last()
+        return record_timestamp_ns(transaction) if transaction else 0
+
+    def aggregate(self, after_position: int = 0) -> Dict:
+        """Return {"count": ..., "total_revenue": ...} over records after a tail() position"""
+        raise NotImplementedError
+
+    def close(self):
+        """Release any resources held by the store"""
+        pass
+
+
+def record_timestamp_ns(transaction: Dict) -> int:
+    """Nanosecond sort key of a record; older records only have whole seconds"""
+    timestamp_ns = transaction.get("timestamp_ns")
+    if timestamp_ns is None:
+        timestamp_ns = transaction.get("timestamp_unix", 0) * 1_000_000_000
+    return timestamp_ns
+
+
+def journal_entry(transaction_id: str, fields: Dict, current: Dict, prev_hash: Optional[str]) -> Dict:
+    """Build the update journal entry for merging fields into the record current"""
+    return {
+        "transaction_id": transaction_id,
+        "fields": fields,
+        "previous": {k: current[k] for k in fields if k in current},
+        "prev_hash": prev_hash
+    }
+
+
+def _in_range(
+    transaction: Dict,
+    start_unix: Optional[int],
+    end_unix: Optional[int],
+    start_id: Optional[str],
+    end_id: Optional[str],
+    start_ns: Optional[int],
+    end_ns: Optional[int]
+) -> bool:
+    """Check a record against half-open timestamp and transaction_id ranges"""
+    ts = transaction.get("timestamp_unix", 0)
+    if start_unix is not None and ts < start_unix:
+        return False
+    if end_unix is not None and ts >= end_unix:
+        return False
+    transaction_id = transaction["transaction_id"]
+    if start_id is not None and transaction_id < start_id:
+        return False
+    if end_id is not None and transaction_id >= end_id:
+        return False
+    if start_ns is not None or end_ns is not None:
+        timestamp_ns = record_timestamp_ns(transaction)
+        if start_ns is not None and timestamp_ns < start_ns:
+            return False
+        if end_ns is not None and timestamp_ns >= end_ns:
+            return False
+    return True
+
+
+class JSONLTransactionStore(TransactionStore):
+    """
+    Store records as JSON Lines in a flat file (the original log format)
+
+    The log is only rewritten by drop_before(). Updates go to a sidecar
+    file of journal entries (see update()) tagged with the position of the
+    record they change. It is replayed into memory on startup and merged
+    into records as they are read. Updates to records that drop_before()
+    removed are left out of memory, so it holds only updates to records
+    still in the log: about 400 bytes per updated record. With async
+    payment confirmation every record is updated, so without the cold
+    archive this grows with the whole log; use the SQLite store there.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.updates_path = path + ".updates"
+        self.base_path = path + ".base"
+        self._lock = threading.Lock()
+        self._base = self._load_base()
+        # transaction_id -> (record position, merged fields)
+        self._updates: Dict[str, Tuple[int, Dict]] = {}
+        if os.path.exists(self.updates_path):
+            with open(self.updates_path, 'r') as f:
+                for line in f:
+                    if line.endswith("\n") and line.strip():
+                        update = codec.loads(line)
+                        self._apply_update(update["transaction_id"], update.get("record_position"), update["fields"])
+
+    def _apply_update(self, transaction_id: str, record_position: Optional[int], fields: Dict):
+        if record_position is not None and record_position <= self._base:
+            return
+        _, merged = self._updates.get(transaction_id, (record_position, {}))
+        merged.update(fields)
+        self._updates[transaction_id] = (record_position, merged)
+
+    def _first_line_digest(self) -> Optional[str]:
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'rb') as f:
+            line = f.readline()
+        return hashlib.sha256(line).hexdigest() if line.endswith(b"\n") else None
+
+    def _load_base(self) -> int:
+        # Byte offset of the start of the file in tail() positions, which
+        # stay the same after drop_before(). The sidecar names the first
+        # line it expects; if the rewritten log never replaced the old
+        # one, the previous offset still applies.
+        if not os.path.exists(self.base_path):
+            return 0
+        with open(self.base_path, 'r') as f:
+            base = codec.loads(f.read())
+        if base["first_line_sha256"] == self._first_line_digest():
+            return base["position"]
+        return base["previous_position"]
+
+    def append_many(self, transactions: Iterable[Dict]):
+        lines = "".join(codec.dumps(tx) + "\n" for tx in transactions)
+        if not lines:
+            return
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(lines)
+
+    def _read_all(self, after_position: int = 0) -> Iterator[Dict]:
+        if not os.path.exists(self.path):
+            return
+        with self._lock:
+            base = self._base
+            f = open(self.path, 'rb')
+        with f:
+            if after_position > base:
+                f.seek(after_position - base)
+            for line in f:
+                # A line without its newline is an append still in flight
+                if line.endswith(b"\n") and line.strip():
+                    yield self._decode(line)
+
+    def _decode(self, line) -> Dict:
+        transaction = codec.loads(line)
+        if self._updates:
+            update = self._updates.get(transaction["transaction_id"])
+            if update:
+                transaction.update(update[1])
+        return transaction
+
+    def _find_recent(self, transaction_id: str) -> Optional[Tuple[int, Dict]]:
+        # Read backwards from the end of the log, since updates are for
+        # records written moments ago; returns (position, record). Lines
+        # are only decoded if the ID appears in them.
+        if not os.path.exists(self.path):
+            return None
+        needle = codec.dumps_bytes(transaction_id)
+        with self._lock:
+            base = self._base
+            f = open(self.path, 'rb')
+        with f:
+            end = f.seek(0, os.SEEK_END)
+            suffix = b""
+            while end > 0:
+                start = max(0, end - 65536)
+                f.seek(start)
+                data = f.read(end - start) + suffix
+                lines = data.split(b"\n")
+                # After the last newline: nothing, or an append still in flight
+                position = start + len(data) - len(lines.pop())
+                # The first line may continue in the block before this one
+                suffix = lines.pop(0) + b"\n" if start and lines else b""
+                for line in reversed(lines):
+                    if needle in line:
+                        transaction = self._decode(line)
+                        if transaction["transaction_id"] == transaction_id:
+                            return base + position, transaction
+                    position -= len(line) + 1
+                end = start
+        return None
+
+    def update(self, transaction_id: str, fields: Dict, prev_hash: Optional[str] = None) -> Optional[Dict]:
+        update = self._updates.get(transaction_id)
+        if update and update[0] is not None and fields.keys() <= update[1].keys():
+            # Every field being replaced is already in the overlay
+            record_position, current = update
+        else:
+            found = self._find_recent(transaction_id)
+            if found is None:
+                return None
+            record_position, current = found
+        entry = journal_entry(transaction_id, fields, current, prev_hash)
+        line = codec.dumps(dict(entry, record_position=record_position)) + "\n"
+        with self._lock:
+            with open(self.updates_path, 'a') as f:
+                f.write(line)
+            self._apply_update(transaction_id, record_position, fields)
+        return entry
+
+    def get_by_id(self, transaction_id: str) -> Optional[Dict]:
+        for transaction in self._read_all():
+            if transaction["transaction_id"] == transaction_id:
+                return transaction
+        return None
+
+    def get_by_hash(self, document_hash: str) -> List[Dict]:
+        return [tx for tx in self._read_all() if tx.get("document_hash") == document_hash]
+
+    def lookup_ids(self, transaction_ids: Iterable[str]) -> Iterator[Tuple[str, Dict]]:
+        # One pass over the file, stopping once every ID has been seen
+        remaining = set(transaction_ids)
+        if not remaining:
+            return
+        for transaction in self._read_all():
+            transaction_id = transaction["transaction_id"]
+            if transaction_id in remaining:
+                remaining.discard(transaction_id)
+                yield transaction_id, transaction
+                if not remaining:
+                    return
+
+    def lookup_hashes(self, document_hashes: Iterable[str]) -> Iterator[Tuple[str, Dict]]:
+        wanted = set(document_hashes)
+        if not wanted:
+            return
+        for transaction in self._read_all():
+            document_hash = transaction.get("document_hash")
+            if document_hash in wanted:
+                yield document_hash, transaction
+
+    def lookup(
+        self,
+        transaction_ids: Iterable[str],
+        document_hashes: Iterable[str]
+    ) -> Iterator[Tuple[str, str, Dict]]:
+        # Both sets are matched in the same pass over the file
+        remaining = set(transaction_ids)
+        wanted = set(document_hashes)
+        if not remaining and not wanted:
+            return
+        for transaction in self._read_all():
+            transaction_id = transaction["transaction_id"]
+            if transaction_id in remaining:
+                remaining.discard(transaction_id)
+                yield "transaction_id", transaction_id, transaction
+            document_hash = transaction.get("document_hash")
+            if document_hash in wanted:
+                yield "document_hash", document_hash, transaction
+            if not remaining and not wanted:
+                return
+
+    def scan(
+        self,
+        start_unix: Optional[int] = None,
+        end_unix: Optional[int] = None,
+        start_id: Optional[str] = None,
+        end_id: Optional[str] = None,
+        start_ns: Optional[int] = None,
+        end_ns: Optional[int] = None,
+        after_position: int = 0
+    ) -> Iterator[Dict]:
+        for transaction in self._read_all(after_position):
+            if _in_range(transaction, start_unix, end_unix, start_id, end_id, start_ns, end_ns):
+                yield transaction
+
+    def tail(self, position: int = 0) -> Iterator[Tuple[int, Dict]]:
+        # Positions are byte offsets just past each record's newline,
+        # counted from the start of the log before any drop_before()
+        if not os.path.exists(self.path):
+            return
+        with self._lock:
+            base = self._base
+            f = open(self.path, 'rb')
+        with f:
+            position = max(position, base)
+            f.seek(position - base)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    return
+                position += len(line)
+                if line.strip():
+                    yield position, self._decode(line)
+
+    def tail_updates(self, position: int = 0) -> Iterator[Tuple[int, Dict]]:
+        # Positions are byte offsets into the updates sidecar file
+        if not os.path.exists(self.updates_path):
+            return
+        with open(self.updates_path, 'rb') as f:
+            f.seek(position)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    return
+                position += len(line)
+                if line.strip():
+                    entry = codec.loads(line)
+                    entry.pop("record_position", None)
+                    yield position, entry
+
+    def drop_before(self, position: int):
+        # Copy everything after position into a new file and swap it in.
+        # Appends only wait for the final catch-up copy and the rename.
+        compact_path = self.path + ".compact"
+        with self._lock:
+            base = self._base
+        if position <= base or not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as src, open(compact_path, 'wb') as dst:
+            src.seek(position - base)
+            first_line = src.readline()
+            dst.write(first_line)
+            shutil.copyfileobj(src, dst)
+            with self._lock:
+                shutil.copyfileobj(src, dst)
+                dst.flush()
+                os.fsync(dst.fileno())
+                with open(self.base_path + ".tmp", 'w') as f:
+                    f.write(codec.dumps({
+                        "position": position,
+                        "previous_position": base,
+                        "first_line_sha256": hashlib.sha256(first_line).hexdigest() if first_line else None
+                    }))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(self.base_path + ".tmp", self.base_path)
+                os.replace(compact_path, self.path)
+                self._base = position
+                self._updates = {
+                    transaction_id: update for transaction_id, update in self._updates.items()
+                    if update[0] is None or update[0] > position
+                }
+
+    def last(self) -> Optional[Dict]:
+        # The newest record is the last complete line; read backwards
+        # from the end of the file to find it
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'rb') as f:
+            end = f.seek(0, os.SEEK_END)
+            block = 4096
+            while True:
+                start = max(0, end - block)
+                f.seek(start)
+                lines = f.read(end - start).splitlines(keepends=True)
+                complete = [line for line in lines if line.endswith(b"\n") and line.strip()]
+                if len(complete) > (1 if start else 0) or start == 0:
+                    break
+                block *= 2
+        if not complete:
+            return None
+        return self._decode(complete[-1])
+
+    def aggregate(self, after_position: int = 0) -> Dict:
+        count = 0
+        total_revenue = 0
+        for transaction in self._read_all(after_position):
+            count += 1
+            total_revenue += transaction.get("payment_amount", 0)
+        return {"count": count, "total_revenue": total_revenue}
+
+
+class SQLiteTransactionStore(TransactionStore):
+    """
+    Store records in SQLite running in WAL mode
+
+    Lookup columns are indexed; the full record is kept as JSON so the
+    store returns exactly what was appended. Statements are fixed strings
+    so sqlite3's statement cache reuses the prepared forms.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS transactions (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id TEXT NOT NULL,
+            timestamp_unix INTEGER NOT NULL,
+            timestamp_ns INTEGER NOT NULL DEFAULT 0,
+            document_hash TEXT,
+            payment_amount REAL NOT NULL DEFAULT 0,
+            record TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_transactions_id ON transactions (transaction_id);
+        CREATE INDEX IF NOT EXISTS idx_transactions_hash ON transactions (document_hash);
+        CREATE INDEX IF NOT EXISTS idx_transactions_unix ON transactions (timestamp_unix);
+        CREATE TABLE IF NOT EXISTS updates (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id TEXT NOT NULL,
+            fields TEXT NOT NULL,
+            previous TEXT NOT NULL DEFAULT '{}',
+            prev_hash TEXT
+        );
+    """
+
+    _INDEX_NS = "CREATE INDEX IF NOT EXISTS idx_transactions_ns ON transactions (timestamp_ns)"
+
+    _INSERT = (
+        "INSERT INTO transactions "
+        "(transaction_id, timestamp_unix, timestamp_ns, document_hash, payment_amount, record) "
+        "VALUES (?, ?, ?, ?, ?, ?)"
+    )
+    _SELECT_BY_ID = "SELECT record FROM transactions WHERE transaction_id = ? ORDER BY seq LIMIT 1"
+    _SELECT_BY_HASH = "SELECT record FROM transactions WHERE document_hash = ? ORDER BY seq"
+    _UPDATE_RECORD = "UPDATE transactions SET record = ? WHERE seq = ?"
+    _SELECT_FOR_UPDATE = "SELECT seq, record FROM transactions WHERE transaction_id = ? ORDER BY seq LIMIT 1"
+    _MAX_NS = "SELECT COALESCE(MAX(timestamp_ns), 0) FROM transactions"
+    _SELECT_LAST = "SELECT record FROM transactions ORDER BY seq DESC LIMIT 1"
+    _SELECT_AFTER = "SELECT seq, record FROM transactions WHERE seq > ? ORDER BY seq"
+    _INSERT_UPDATE = "INSERT INTO updates (transaction_id, fields, previous, prev_hash) VALUES (?, ?, ?, ?)"
+    _SELECT_UPDATES_AFTER = (
+        "SELECT seq, transaction_id, fields, previous, prev_hash FROM updates WHERE seq > ? ORDER BY seq"
+    )
+    _AGGREGATE = "SELECT COUNT(*), COALESCE(SUM(payment_amount), 0) FROM transactions WHERE seq > ?"
+    _DELETE_BEFORE = (
+        "DELETE FROM transactions WHERE seq IN "
+        "(SELECT seq FROM transactions WHERE seq <= ? ORDER BY seq LIMIT ?)"
+    )
+
+    # Rows fetched per round trip while scanning
+    SCAN_BATCH_SIZE = 1000
+
+    # Keys per IN (...) query for batched lookups; stays under SQLite's
+    # default host parameter limit
+    LOOKUP_BATCH_SIZE = 500
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self._SCHEMA)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(transactions)")]
+        if "timestamp_ns" not in columns:
+            # Databases created before nanosecond timestamps
+            self._conn.execute("ALTER TABLE transactions ADD COLUMN timestamp_ns INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("UPDATE transactions SET timestamp_ns = timestamp_unix * 1000000000")
+        self._conn.execute(self._INDEX_NS)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(updates)")]
+        if "prev_hash" not in columns:
+            # Journals written before update entries were chained
+            self._conn.execute("ALTER TABLE updates ADD COLUMN previous TEXT NOT NULL DEFAULT '{}'")
+            self._conn.execute("ALTER TABLE updates ADD COLUMN prev_hash TEXT")
+
+    @staticmethod
+    def _row(transaction: Dict) -> tuple:
+        return (
+            transaction["transaction_id"],
+            transaction.get("timestamp_unix", 0),
+            record_timestamp_ns(transaction),
+            transaction.get("document_hash"),
+            transaction.get("payment_amount", 0),
+            codec.dumps(transaction),
+        )
+
+    def append_many(self, transactions: Iterable[Dict]):
+        rows = [self._row(tx) for tx in transactions]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(self._INSERT, rows)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def update(self, transaction_id: str, fields: Dict, prev_hash: Optional[str] = None) -> Optional[Dict]:
+        entry = None
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(self._SELECT_FOR_UPDATE, (transaction_id,)).fetchone()
+                if row:
+                    seq, record = row
+                    transaction = codec.loads(record)
+                    entry = journal_entry(transaction_id, fields, transaction, prev_hash)
+                    transaction.update(fields)
+                    self._conn.execute(self._UPDATE_RECORD, (codec.dumps(transaction), seq))
+                    self._conn.execute(self._INSERT_UPDATE, (
+                        transaction_id, codec.dumps(fields), codec.dumps(entry["previous"]), prev_hash
+                    ))
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return entry
+
+    def get_by_id(self, transaction_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(self._SELECT_BY_ID, (transaction_id,)).fetchone()
+        return codec.loads(row[0]) if row else None
+
+    def get_by_hash(self, document_hash: str) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(self._SELECT_BY_HASH, (document_hash,)).fetchall()
+        return [codec.loads(row[0]) for row in rows]
+
+    def _lookup_sorted(self, column: str, keys: Iterable[str]) -> Iterator[Tuple[str, Dict]]:
+        # Sorted keys walk the index in order, one chunk per statement
+        keys = sorted(set(keys))
+        for i in range(0, len(keys), self.LOOKUP_BATCH_SIZE):
+            chunk = keys[i:i + self.LOOKUP_BATCH_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            query = (
+                f"SELECT {column}, record FROM transactions "
+                f"WHERE {column} IN ({placeholders}) ORDER BY seq"
+            )
+            with self._lock:
+                rows = self._conn.execute(query, chunk).fetchall()
+            for key, record in rows:
+                yield key, codec.loads(record)
+
+    def lookup_ids(self, transaction_ids: Iterable[str]) -> Iterator[Tuple[str, Dict]]:
+        seen = set()
+        for transaction_id, transaction in self._lookup_sorted("transaction_id", transaction_ids):
+            if transaction_id not in seen:
+                seen.add(transaction_id)
+                yield transaction_id, transaction
+
+    def lookup_hashes(self, document_hashes: Iterable[str]) -> Iterator[Tuple[str, Dict]]:
+        return self._lookup_sorted("document_hash", document_hashes)
+
+    def scan(
+        self,
+        start_unix: Optional[int] = None,
+        end_unix: Optional[int] = None,
+        start_id: Optional[str] = None,
+        end_id: Optional[str] = None,
+        start_ns: Optional[int] = None,
+        end_ns: Optional[int] = None,
+        after_position: int = 0
+    ) -> Iterator[Dict]:
+        clauses = []
+        params = []
+        for column, op, value in (
+            ("seq", ">", after_position or None),
+            ("timestamp_unix", ">=", start_unix),
+            ("timestamp_unix", "<", end_unix),
+            ("transaction_id", ">=", start_id),
+            ("transaction_id", "<", end_id),
+            ("timestamp_ns", ">=", start_ns),
+            ("timestamp_ns", "<", end_ns),
+        ):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        # Read on a dedicated connection so a long scan never holds the
+        # writer's lock; WAL lets it run alongside appends.
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            cursor = conn.execute(f"SELECT record FROM transactions{where} ORDER BY seq", params)
+            while True:
+                rows = cursor.fetchmany(self.SCAN_BATCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    yield codec.loads(row[0])
+        finally:
+            conn.close()
+
+    def tail(self, position: int = 0) -> Iterator[Tuple[int, Dict]]:
+        # Positions are row sequence numbers
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            cursor = conn.execute(self._SELECT_AFTER, (position,))
+            while True:
+                rows = cursor.fetchmany(self.SCAN_BATCH_SIZE)
+                if not rows:
+                    break
+                for seq, record in rows:
+                    yield seq, codec.loads(record)
+        finally:
+            conn.close()
+
+    def tail_updates(self, position: int = 0) -> Iterator[Tuple[int, Dict]]:
+        # Positions are update journal sequence numbers
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            rows = conn.execute(self._SELECT_UPDATES_AFTER, (position,))
+            for seq, transaction_id, fields, previous, prev_hash in rows:
+                yield seq, {
+                    "transaction_id": transaction_id,
+                    "fields": codec.loads(fields),
+                    "previous": codec.loads(previous),
+                    "prev_hash": prev_hash
+                }
+        finally:
+            conn.close()
+
+    def drop_before(self, position: int):
+        # Delete in small transactions so appends are never held up for
+        # long; AUTOINCREMENT keeps seq from reusing removed positions and
+        # the freed pages are reused by later appends
+        while True:
+            with self._lock:
+                deleted = self._conn.execute(self._DELETE_BEFORE, (position, self.SCAN_BATCH_SIZE)).rowcount
+            if deleted < self.SCAN_BATCH_SIZE:
+                return
+
+    def last(self) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(self._SELECT_LAST).fetchone()
+        return codec.loads(row[0]) if row else None
+
+    def max_timestamp_ns(self) -> int:
+        with self._lock:
+            return self._conn.execute(self._MAX_NS).fetchone()[0]
+
+    def aggregate(self, after_position: int = 0) -> Dict:
+        with self._lock:
+            count, total_revenue = self._conn.execute(self._AGGREGATE, (after_position,)).fetchone()
+        return {"count": count, "total_revenue": total_revenue}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+STORE_BACKENDS = {
+    "jsonl": JSONLTransactionStore,
+    "sqlite": SQLiteTransactionStore,
+}
+
+
+def open_store(backend: str, path: str) -> TransactionStore:
+    """Create a transaction store by backend name ("jsonl" or "sqlite")"""
+    try:
+        store_class = STORE_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown transaction store backend: {backend}")
+    return store_class(path)
@@ -0,0 +1,97 @@
+"""
+Batch Verification - Re-verify thousands of timestamp proofs in one request
+Resolves IDs and hashes in a single pass and streams results as NDJSON
+"""
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from transaction_store import TransactionStore
+from typing import Dict, Iterator, List, Optional
+import codec
+import time
+
+# Upper bound on IDs + hashes accepted in one request
+MAX_BATCH_VERIFY = 50000
+
+
+class BatchVerifyRequest(BaseModel):
+    """Transaction IDs and/or document hashes to verify"""
+    transaction_ids: Optional[List[str]] = None
+    document_hashes: Optional[List[str]] = None
+
+
+def verify_batch_stream(
+    store: TransactionStore,
+    transaction_ids: List[str],
+    document_hashes: List[str]
+) -> Iterator[bytes]:
+    """
+    Yield one NDJSON line per result, then a summary line
+
+    Found items are emitted as the store resolves them; items that were
+    never found are emitted once resolution finishes.
+    """
+    start = time.perf_counter()
+    verified = 0
+
+    pending_ids = set(transaction_ids)
+    pending_hashes = set(document_hashes)
+    found_hashes = set()
+    for kind, key, transaction in store.lookup(set(pending_ids), pending_hashes):
+        if kind == "transaction_id":
+            pending_ids.discard(key)
+            verified += 1
+        elif key not in found_hashes:
+            found_hashes.add(key)
+            verified += 1
+        yield _line({kind: key, "verified": True, "transaction": transaction})
+    for transaction_id in sorted(pending_ids):
+        yield _line({"transaction_id": transaction_id, "verified": False})
+    for document_hash in sorted(pending_hashes - found_hashes):
+        yield _line({"document_hash": document_hash, "verified": False})
+
+    elapsed = time.perf_counter() - start
+    requested = len(set(transaction_ids)) + len(set(document_hashes))
+    yield _line({
+        "summary": {
+            "requested": requested,
+            "verified": verified,
+            "not_found": requested - verified,
+            "seconds": round(elapsed, 6),
+            "items_per_second": round(requested / elapsed, 1) if elapsed else None
+        }
+    })
+
+
+def _line(result: Dict) -> bytes:
+    return codec.dumps_bytes(result) + b"\n"
+
+
+def add_batch_verify_routes(app: FastAPI, store: TransactionStore):
+    """Add the batch verification route to the main FastAPI app"""
+
+    @app.post("/verify/batch")
+    def verify_batch(batch: BatchVerifyRequest):
+        """
+        Verify many timestamps by transaction ID or document hash (free endpoint)
+
+        Returns NDJSON: one line per transaction ID, one line per matching
+        record for each document hash (or a single unverified line), and a
+        final summary line with throughput in items per second.
+        """
+        transaction_ids = batch.transaction_ids or []
+        document_hashes = batch.document_hashes or []
+
+        if not transaction_ids and not document_hashes:
+            raise HTTPException(status_code=400, detail="Must provide 'transaction_ids' or 'document_hashes'")
+        if len(transaction_ids) + len(document_hashes) > MAX_BATCH_VERIFY:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Batch too large - at most {MAX_BATCH_VERIFY} items per request"
+            )
+
+        return StreamingResponse(
+            verify_batch_stream(store, transaction_ids, document_hashes),
+            media_type="application/x-ndjson"
+        )